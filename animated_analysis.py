@@ -1,93 +1,37 @@
+import os
+import shutil
+import argparse
+import tempfile
+import subprocess
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from matplotlib.patches import Rectangle, Circle, FancyBboxPatch
+from matplotlib.colors import to_rgba
+from matplotlib.collections import EllipseCollection
+from matplotlib.patches import Rectangle, FancyBboxPatch
 from scipy.stats import binom
-import random
-from collections import deque
-
-class RealisticPacket:
-    def __init__(self, user_id, packet_id, creation_time):
-        self.user_id = user_id
-        self.packet_id = packet_id
-        self.creation_time = creation_time
-        self.color = plt.cm.Set3(user_id % 12)
-        self.size = random.randint(500, 1500)  # bytes
-        self.position = [0, 0]
-        self.status = "created"
-        self.transmission_progress = 0
-        self.bits_transmitted = 0
-        self.start_transmission_time = None
-        
-    def update_transmission(self, available_bandwidth, dt):
-        """Update packet transmission progress based on available bandwidth"""
-        if self.start_transmission_time is None:
-            self.start_transmission_time = self.creation_time
-            
-        bits_this_frame = available_bandwidth * dt
-        bits_needed = self.size * 8 - self.bits_transmitted
-        
-        if bits_this_frame >= bits_needed:
-            self.bits_transmitted = self.size * 8
-            self.transmission_progress = 1.0
-            return True
-        else:
-            self.bits_transmitted += bits_this_frame
-            self.transmission_progress = self.bits_transmitted / (self.size * 8)
-            return False
-
-class RealisticPacketSwitch:
-    def __init__(self, N_users, user_active_prob=0.1):
-        self.N_users = N_users
-        self.user_active_prob = user_active_prob
-        self.link_capacity = 1e9  # 1 Gb/s
-        self.user_capacity = 100e6  # 100 Mb/s
-        
-        # Network state
-        self.users = [{'active': False, 'packets_sent': 0, 'position': [0, 0], 'id': i} for i in range(N_users)]
-        self.packets = []
-        self.buffer = deque()
-        self.max_buffer_size = 50
-        self.processed_packets = 0
-        self.dropped_packets = 0
-        self.time = 0
-        self.dt = 0.05
-        
-        # Statistics
-        self.active_users_history = []
-        self.throughput_history = []
-        self.loss_rate_history = []
-        self.buffer_occupancy_history = []
-        self.utilization_history = []
-        self.time_history = []
-        
-        self.bytes_processed_this_second = 0
-        self.last_throughput_update = 0
-        self.current_throughput = 0
-        self.current_utilization = 0
-        self.current_loss_rate = 0
-        self.current_active_users = 0
-        
-        self.theoretical_stats = self.calculate_theoretical_probabilities()
-        
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from packet_switch import PacketSwitchCore, TRANSMITTING, PROCESSING, theoretical_probabilities
+from link_config import DEFAULT_LINK
+from onoff_model import overload_statistics
+from sim_trace import SimulationTrace, replay, simulation_from_meta, link_from_meta
+
+PACKET_COLORS = plt.cm.Set3(np.arange(12))
+IDLE_FACE, IDLE_EDGE = to_rgba('lightblue'), to_rgba('darkblue')
+ACTIVE_FACE, ACTIVE_EDGE = to_rgba('limegreen'), to_rgba('darkgreen')
+SWITCH_POSITION = np.array([6.0, 4.0])
+MAX_USER_LABELS = 100
+BUFFER_SLOTS = 18
+
+class RealisticPacketSwitch(PacketSwitchCore):
+    def __init__(self, N_users, user_active_prob=0.1, seed=None, link=DEFAULT_LINK, mean_on_time=None,
+                 max_buffer_size=50, processing_capacity=8, dt=0.05):
+        super().__init__(N_users, user_active_prob, seed, max_buffer_size, processing_capacity, link=link,
+                         mean_on_time=mean_on_time, dt=dt)
+        self.user_positions = np.zeros((self.N_users, 2))
         self.setup_visualization()
     
-    def calculate_theoretical_probabilities(self):
-        n = self.N_users
-        p = self.user_active_prob
-        prob_more_than_10 = 1 - binom.cdf(10, n, p)
-        expected_active = n * p
-        max_supported_users = self.link_capacity / self.user_capacity
-        prob_overload = 1 - binom.cdf(max_supported_users, n, p)
-        return {
-            'n': n,
-            'p': p,
-            'prob_more_than_10': prob_more_than_10,
-            'expected_active': expected_active,
-            'max_supported_users': max_supported_users,
-            'prob_overload': prob_overload
-        }
-    
     def setup_visualization(self):
         plt.rcParams['font.size'] = 10
         plt.rcParams['font.weight'] = 'bold'
@@ -100,9 +44,13 @@ class RealisticPacketSwitch:
         self.ax_buffer = plt.subplot2grid((2, 2), (1, 1))
         
         # Main title aligned to the left
+        threshold = self.theoretical_stats['threshold']
+        tail_label = f'P(X>{threshold})' if threshold is not None else 'P(Overload)'
+        rates = (f'{len(self.link.user_classes)} User Classes' if self.link.user_classes
+                 else f'{self.user_capacity / 1e6:g} Mb/s per User')
         title_text = (f'📡 PACKET SWITCHING SIMULATION | 👥 {self.N_users} Users | '
-                     f'🎯 P(X>10) = {self.theoretical_stats["prob_more_than_10"]:.6f} | '
-                     f'⚡ 1 Gb/s Link | 📱 100 Mb/s per User')
+                     f'🎯 {tail_label} = {self.theoretical_stats["prob_over_threshold"]:.6f} | '
+                     f'⚡ {self.link_capacity / 1e9:g} Gb/s Link | 📱 {rates}')
         
         self.fig.suptitle(title_text, fontsize=13, fontweight='bold', y=0.98, x=0.02, ha='left')
         
@@ -117,23 +65,33 @@ class RealisticPacketSwitch:
         self.ax_physical.set_title('🌐 NETWORK TOPOLOGY - Live Packet Flow', fontweight='bold', pad=10)
         self.ax_physical.grid(True, alpha=0.2)
         
-        # Draw users in a circle
+        # Draw users in a circle. Idle users and their labels are static and end up in the
+        # blitted background; active users are drawn on top of them every frame.
         radius = 5
-        for i in range(self.N_users):
-            angle = 2 * np.pi * i / self.N_users
-            x = 1 + radius * np.cos(angle)
-            y = 4 + radius * np.sin(angle)
-            self.users[i]['position'] = [x, y]
-            
-            user_circle = Circle((x, y), 0.25, color='lightblue', alpha=0.8, ec='darkblue', linewidth=1)
-            self.ax_physical.add_patch(user_circle)
-            self.ax_physical.text(x, y, str(i), ha='center', va='center', 
-                                fontsize=7, weight='bold', color='darkblue')
-        
+        angles = 2 * np.pi * np.arange(self.N_users) / max(self.N_users, 1)
+        self.user_positions[:] = np.column_stack([1 + radius * np.cos(angles), 4 + radius * np.sin(angles)])
+        self.user_markers = self.circles(self.user_positions, 0.25, facecolors=[IDLE_FACE], edgecolors=[IDLE_EDGE],
+                                         linewidths=2, zorder=3)
+        self.active_markers = self.circles(np.empty((0, 2)), 0.25, facecolors=[ACTIVE_FACE], edgecolors=[ACTIVE_EDGE],
+                                           linewidths=2, zorder=3, animated=True)
+        # Labels are only readable (and cheap enough to draw) for moderate N
+        self.active_labels = []
+        self.shown_labels = []
+        if self.N_users <= MAX_USER_LABELS:
+            for i, (x, y) in enumerate(self.user_positions):
+                self.ax_physical.text(x, y, str(i), ha='center', va='center', fontsize=7, weight='bold',
+                                      color='darkblue', zorder=4)
+                self.active_labels.append(self.ax_physical.text(x, y, str(i), ha='center', va='center', fontsize=7,
+                                                                weight='bold', color='white', zorder=4, animated=True))
+
+        # All packets in flight (transmitting, buffered, processing) share one collection
+        self.packet_markers = self.circles(np.empty((0, 2)), 0.12, edgecolors='black', linewidths=1, zorder=5,
+                                           animated=True)
+
         # Draw switch with better styling
         switch_rect = Rectangle((5.5, 3), 1, 2, color='red', alpha=0.8, ec='darkred', linewidth=2)
         self.ax_physical.add_patch(switch_rect)
-        self.ax_physical.text(6, 4, 'SWITCH\n1 Gb/s', ha='center', va='center', 
+        self.ax_physical.text(6, 4, f'SWITCH\n{self.link.link_capacity_mbps / 1000:g} Gb/s', ha='center', va='center', 
                             fontsize=9, weight='bold', color='white')
         
         # Draw buffer area
@@ -167,35 +125,49 @@ class RealisticPacketSwitch:
         n = self.N_users
         p = self.user_active_prob
         x = np.arange(0, min(n + 1, 25))
-        pmf = binom.pmf(x, n, p)
+        if self.link.user_classes:
+            # Active users of all classes together: the class binomials convolved
+            pmf = np.ones(1)
+            for c in self.link.user_classes:
+                pmf = np.convolve(pmf, binom.pmf(np.arange(c.count + 1), c.count, c.activity))
+            pmf = np.pad(pmf, (0, max(0, x.size - pmf.size)))[:x.size]
+        else:
+            pmf = binom.pmf(x, n, p)
         
         self.prob_bars = self.ax_probability.bar(x, pmf, alpha=0.8, color='skyblue', 
                                                edgecolor='navy', linewidth=1)
         
-        # Mark critical regions
+        # Mark critical regions (user counts only mean capacity when every user has the same rate)
         max_supported = self.theoretical_stats['max_supported_users']
-        self.ax_probability.axvline(x=max_supported, color='red', linestyle='-', 
-                                  linewidth=3, alpha=0.7, label=f'Capacity Limit ({max_supported} users)')
-        self.ax_probability.axvline(x=10, color='orange', linestyle='--', 
-                                  linewidth=2, alpha=0.7, label='X=10 threshold')
-        
-        # Color bars based on overload probability
-        for i, bar in enumerate(self.prob_bars):
-            if i > max_supported:
-                bar.set_color('red')
-                bar.set_alpha(0.9)
-            elif i > 10:
-                bar.set_color('orange')
-                bar.set_alpha(0.9)
-        
-        self.ax_probability.legend(fontsize=8)
+        threshold = self.theoretical_stats['threshold']
+        if max_supported is not None:
+            self.ax_probability.axvline(x=max_supported, color='red', linestyle='-', 
+                                      linewidth=3, alpha=0.7, label=f'Capacity Limit ({max_supported} users)')
+            self.ax_probability.axvline(x=threshold, color='orange', linestyle='--', 
+                                      linewidth=2, alpha=0.7, label=f'X={threshold} threshold')
+            
+            # Color bars based on overload probability
+            for i, bar in enumerate(self.prob_bars):
+                if i > max_supported:
+                    bar.set_color('red')
+                    bar.set_alpha(0.9)
+                elif i > threshold:
+                    bar.set_color('orange')
+                    bar.set_alpha(0.9)
+            
+            self.ax_probability.legend(fontsize=8)
         
         # Add probability text with better formatting
-        prob_text = (f'🎲 Probability Analysis:\n'
-                    f'P(X > 10) = {self.theoretical_stats["prob_more_than_10"]:.6f}\n'
-                    f'P(Overload) = {self.theoretical_stats["prob_overload"]:.6f}\n'
-                    f'E[X] = {self.theoretical_stats["expected_active"]:.2f} users\n'
-                    f'Max Capacity: {max_supported:.0f} users')
+        if max_supported is not None:
+            prob_text = (f'🎲 Probability Analysis:\n'
+                        f'P(X > {threshold}) = {self.theoretical_stats["prob_over_threshold"]:.6f}\n'
+                        f'P(Overload) = {self.theoretical_stats["prob_overload"]:.6f}\n'
+                        f'E[X] = {self.theoretical_stats["expected_active"]:.2f} users\n'
+                        f'Max Capacity: {max_supported:.0f} users')
+        else:
+            prob_text = (f'🎲 Probability Analysis:\n'
+                        f'P(Overload) = {self.theoretical_stats["prob_overload"]:.6f}\n'
+                        f'E[X] = {self.theoretical_stats["expected_active"]:.2f} users')
         
         self.ax_probability.text(0.65, 0.95, prob_text, transform=self.ax_probability.transAxes,
                                fontsize=8, bbox=dict(boxstyle="round,pad=0.4", facecolor="lightyellow", alpha=0.8),
@@ -213,6 +185,13 @@ class RealisticPacketSwitch:
                                       facecolor="lightgray", alpha=0.6, ec="gray", linewidth=2)
         self.ax_buffer.add_patch(buffer_outline)
         
+        # Buffer slots are created once and shown/recoloured per frame
+        self.buffer_slots = []
+        for i in range(BUFFER_SLOTS):
+            slot = Rectangle((0.03, 0.5 - (i * 0.08)), 0.24, 0.06, alpha=0.9, ec='black', linewidth=0.5, visible=False)
+            self.ax_buffer.add_patch(slot)
+            self.buffer_slots.append(slot)
+
         # Buffer title
         self.ax_buffer.text(0.15, 0.9, 'BUFFER', ha='center', va='center', 
                           fontsize=11, weight='bold', color='darkblue')
@@ -222,219 +201,255 @@ class RealisticPacketSwitch:
                                               fontsize=9, weight='bold',
                                               bbox=dict(boxstyle="round,pad=0.5", facecolor="lightblue", alpha=0.8))
     
-    def update_users(self):
-        active_count = 0
-        for user in self.users:
-            if random.random() < self.user_active_prob:
-                user['active'] = True
-                active_count += 1
-                # Generate packets with higher probability during activity
-                if random.random() < 0.7:  # Increased to see more action
-                    packet = RealisticPacket(user['id'], len(self.packets), self.time)
-                    packet.position = user['position'].copy()
-                    packet.status = "transmitting"
-                    self.packets.append(packet)
-                    user['packets_sent'] += 1
-            else:
-                user['active'] = False
-        return active_count
-    
-    def update_packets(self, active_count):
-        # Calculate available bandwidth
-        if active_count > 0:
-            total_demand = active_count * self.user_capacity
-            if total_demand > self.link_capacity:
-                available_bandwidth_per_user = self.link_capacity / active_count
-            else:
-                available_bandwidth_per_user = self.user_capacity
-        else:
-            available_bandwidth_per_user = 0
-        
-        packets_to_remove = []
-        current_throughput_bytes = 0
-        
-        for packet in self.packets:
-            if packet.status == "transmitting":
-                transmission_complete = packet.update_transmission(available_bandwidth_per_user, self.dt)
-                
-                if transmission_complete:
-                    if len(self.buffer) < self.max_buffer_size:
-                        packet.status = "buffered"
-                        self.buffer.append(packet)
-                    else:
-                        packet.status = "dropped"
-                        packets_to_remove.append(packet)
-                        self.dropped_packets += 1
-            
-            elif packet.status == "buffered":
-                # Update position in buffer visualization
-                try:
-                    index = list(self.buffer).index(packet)
-                    packet.position = [7.2, 3 + (index * 0.07)]
-                except ValueError:
-                    pass
-            
-            elif packet.status == "processing":
-                # Move packet toward destination
-                packet.position[0] += 3.0 * self.dt
-                if packet.position[0] > 9.0:
-                    packet.status = "delivered"
-                    packets_to_remove.append(packet)
-                    self.processed_packets += 1
-                    current_throughput_bytes += packet.size
-        
-        # Update throughput
-        self.bytes_processed_this_second += current_throughput_bytes
-        
-        # Remove processed packets
-        for packet in packets_to_remove:
-            if packet in self.packets:
-                self.packets.remove(packet)
-        
-        # Process packets from buffer
-        processing_capacity = 8  # packets per time step
-        packets_processed = 0
-        
-        while self.buffer and packets_processed < processing_capacity:
-            packet = self.buffer.popleft()
-            packet.status = "processing"
-            packet.position = [7.6, 4]  # Start processing position
-            packets_processed += 1
-    
-    def update_statistics(self, active_count):
-        self.current_active_users = active_count
-        
-        # Update throughput and utilization every second
-        if self.time - self.last_throughput_update >= 1.0:
-            throughput_mbps = (self.bytes_processed_this_second * 8) / 1e6
-            self.current_throughput = throughput_mbps
-            
-            # Calculate utilization
-            self.current_utilization = min(100, (throughput_mbps / 1000) * 100)
-            
-            self.bytes_processed_this_second = 0
-            self.last_throughput_update = self.time
-        
-        # Calculate loss rate
-        total_packets = self.processed_packets + self.dropped_packets
-        self.current_loss_rate = (self.dropped_packets / total_packets * 100) if total_packets > 0 else 0
-        
-        # Buffer occupancy
-        self.current_buffer_occupancy = (len(self.buffer) / self.max_buffer_size) * 100
-    
     def update_visualization(self, active_count):
-        self.update_physical_view(active_count)
-        self.update_buffer_view()
+        self.draw_snapshot(frame_snapshot(self))
+
+    def draw_snapshot(self, snap):
+        """Update every animated artist from a frame snapshot (see frame_snapshot)."""
+        self.update_physical_view(snap)
+        self.update_buffer_view(snap)
+
+    def animated_artists(self):
+        """Artists that change every frame, in drawing order (everything else is blitted from the background)."""
+        return [self.active_markers, *self.shown_labels, self.buffer_fill, self.packet_markers, self.stats_text,
+                *self.buffer_slots, self.metrics_text]
     
-    def update_physical_view(self, active_count):
-        # Clear only dynamic elements (users and packets)
-        for patch in self.ax_physical.patches[:]:
-            if isinstance(patch, Circle):
-                patch.remove()
-        
-        # Update users with activity status
-        for user in self.users:
-            color = 'limegreen' if user['active'] else 'lightblue'
-            user_circle = Circle(user['position'], 0.25, color=color, alpha=0.9, 
-                               ec='darkgreen' if user['active'] else 'darkblue', linewidth=2)
-            self.ax_physical.add_patch(user_circle)
-            
-            # User ID text
-            self.ax_physical.text(user['position'][0], user['position'][1], str(user['id']), 
-                                ha='center', va='center', fontsize=7, weight='bold', 
-                                color='white' if user['active'] else 'darkblue')
-        
+    def circles(self, centers, radius, **kwargs):
+        """Circle collection in physical-view data units whose centers, sizes and colours can be updated in place."""
+        markers = EllipseCollection(2 * radius, 2 * radius, 0, units='xy', offsets=centers,
+                                    offset_transform=self.ax_physical.transData, alpha=0.9, **kwargs)
+        self.ax_physical.add_collection(markers, autolim=False)
+        return markers
+
+    def update_physical_view(self, snap):
+        # Users: only the active ones are redrawn, over the static idle markers
+        active = snap['active']
+        self.active_markers.set_offsets(self.user_positions[active])
+        if self.active_labels:
+            self.shown_labels = [self.active_labels[i] for i in active]
+
         # Update buffer fill with smooth color transition
-        buffer_fill_height = (len(self.buffer) / self.max_buffer_size) * 2
+        buffer_len = snap['buffer_users'].size
+        buffer_fill_height = (buffer_len / self.max_buffer_size) * 2
         self.buffer_fill.set_height(buffer_fill_height)
-        
-        fill_ratio = len(self.buffer) / self.max_buffer_size
+
+        fill_ratio = buffer_len / self.max_buffer_size
         if fill_ratio > 0.8:
             self.buffer_fill.set_color('red')
         elif fill_ratio > 0.5:
             self.buffer_fill.set_color('orange')
         else:
             self.buffer_fill.set_color('limegreen')
-        
-        # Draw packets with better visualization
-        for packet in self.packets:
-            if packet.status == "transmitting":
-                # Animate packet movement from user to switch
-                start_pos = self.users[packet.user_id]['position']
-                end_pos = [6, 4]
-                
-                progress = packet.transmission_progress
-                packet.position[0] = start_pos[0] + (end_pos[0] - start_pos[0]) * progress
-                packet.position[1] = start_pos[1] + (end_pos[1] - start_pos[1]) * progress
-                
-                # Larger, more visible packets
-                packet_circle = Circle(packet.position, 0.12, color=packet.color, alpha=0.9,
-                                     ec='black', linewidth=1)
-                self.ax_physical.add_patch(packet_circle)
-            
-            elif packet.status in ["buffered", "processing"]:
-                packet_circle = Circle(packet.position, 0.1, color=packet.color, alpha=0.9,
-                                     ec='black', linewidth=1)
-                self.ax_physical.add_patch(packet_circle)
-        
+
+        # Packets: transmitting ones move from their user to the switch, buffered ones stack
+        # up in the buffer, processing ones travel to the destination
+        start_pos = self.user_positions[snap['tx_users']]
+        transmitting_xy = start_pos + (SWITCH_POSITION - start_pos) * snap['tx_progress'][:, None]
+        buffered_xy = np.column_stack([np.full(buffer_len, 7.2), 3 + np.arange(buffer_len) * 0.07])
+        processing_xy = np.column_stack([snap['proc_x'], np.full(snap['proc_x'].size, 4.0)])
+
+        users = np.concatenate([snap['tx_users'], snap['buffer_users'], snap['proc_users']])
+        self.packet_markers.set_offsets(np.concatenate([transmitting_xy, buffered_xy, processing_xy]))
+        self.packet_markers.set_facecolors(PACKET_COLORS[users % len(PACKET_COLORS)])
+        diameters = np.full(users.size, 0.2)
+        diameters[:snap['tx_users'].size] = 0.24  # Larger, more visible packets on the links
+        self.packet_markers.set_widths(diameters)
+        self.packet_markers.set_heights(diameters)
+
         # Update real-time statistics
         stats_text = (f'📊 REAL-TIME STATISTICS:\n'
-                     f'⏱️  Time: {self.time:.1f}s\n'
-                     f'👥 Active Users: {self.current_active_users}/{self.N_users}\n'
-                     f'⚡ Utilization: {self.current_utilization:.1f}%\n'
-                     f'📦 Throughput: {self.current_throughput:.1f} Mb/s\n'
-                     f'❌ Loss Rate: {self.current_loss_rate:.1f}%\n'
-                     f'💾 Buffer: {len(self.buffer)}/{self.max_buffer_size} ({self.current_buffer_occupancy:.1f}%)\n'
-                     f'📨 Processed: {self.processed_packets} | ❌ Dropped: {self.dropped_packets}')
+                     f'⏱️  Time: {snap["time"]:.1f}s\n'
+                     f'👥 Active Users: {snap["active_users"]}/{self.N_users}\n'
+                     f'⚡ Utilization: {snap["utilization"]:.1f}%\n'
+                     f'📦 Throughput: {snap["throughput"]:.1f} Mb/s\n'
+                     f'❌ Loss Rate: {snap["loss_rate"]:.1f}%\n'
+                     f'⌛ Delay p50/p99: {snap["delay_p50"] * 1e3:.0f}/{snap["delay_p99"] * 1e3:.0f} ms\n'
+                     f'💾 Buffer: {buffer_len}/{self.max_buffer_size} ({snap["buffer_occupancy"]:.1f}%)\n'
+                     f'📨 Processed: {snap["processed"]} | ❌ Dropped: {snap["dropped"]}')
         
         self.stats_text.set_text(stats_text)
     
-    def update_buffer_view(self):
-        # Clear previous buffer packets
-        for patch in self.ax_buffer.patches[1:]:  # Keep the outline
-            patch.remove()
-        
-        # Draw packets in buffer with better visualization
-        for i, packet in enumerate(list(self.buffer)[:18]):  # Show more packets
-            y_pos = 0.5 - (i * 0.08)
-            packet_rect = Rectangle((0.03, y_pos), 0.24, 0.06, 
-                                  color=packet.color, alpha=0.9,
-                                  ec='black', linewidth=0.5)
-            self.ax_buffer.add_patch(packet_rect)
-        
+    def update_buffer_view(self, snap):
+        # Show the first packets in the buffer in the pre-made slots
+        shown = snap['buffer_users'][:len(self.buffer_slots)]
+        for slot, user in zip(self.buffer_slots, shown):
+            slot.set_facecolor(PACKET_COLORS[user % len(PACKET_COLORS)])
+            slot.set_visible(True)
+        for slot in self.buffer_slots[len(shown):]:
+            slot.set_visible(False)
+
         # Update performance metrics
-        transmitting_count = sum(1 for p in self.packets if p.status == "transmitting")
-        processing_count = sum(1 for p in self.packets if p.status == "processing")
-        
         metrics_text = (f'🚀 PERFORMANCE METRICS:\n'
-                       f'📦 Packets in System: {len(self.packets)}\n'
-                       f'  ├ Transmitting: {transmitting_count}\n'
-                       f'  ├ In Buffer: {len(self.buffer)}\n'
-                       f'  └ Processing: {processing_count}\n'
+                       f'📦 Packets in System: {snap["packets"]}\n'
+                       f'  ├ Transmitting: {snap["tx_users"].size}\n'
+                       f'  ├ In Buffer: {snap["buffer_users"].size}\n'
+                       f'  └ Processing: {snap["proc_users"].size}\n'
                        f'⚡ System Status:\n')
         
-        if self.current_utilization > 90:
+        if snap['utilization'] > 90:
             metrics_text += '  🔴 CRITICAL - High Load'
-        elif self.current_utilization > 70:
+        elif snap['utilization'] > 70:
             metrics_text += '  🟠 WARNING - Medium Load'
         else:
             metrics_text += '  🟢 NORMAL - Low Load'
             
-        if self.current_loss_rate > 5:
+        if snap['loss_rate'] > 5:
             metrics_text += '\n  ❌ HIGH PACKET LOSS'
         
         self.metrics_text.set_text(metrics_text)
     
     def update(self, frame):
-        self.time += self.dt
-        active_count = self.update_users()
-        self.update_packets(active_count)
-        self.update_statistics(active_count)
-        self.update_visualization(active_count)
-        return []
-
-def run_comparison_simulations():
-    """Run simulations for different user counts"""
+        active_count = self.step()
+        if self.profiler is None:
+            self.update_visualization(active_count)
+        else:
+            with self.profiler.phase('visualization'):
+                self.update_visualization(active_count)
+        return self.animated_artists()
+
+def frame_snapshot(sim):
+    """Everything the view draws for one frame, copied out of a PacketSwitchCore (small arrays and scalars)."""
+    table = sim.packets
+    transmitting = table.rows(TRANSMITTING)
+    processing = table.rows(PROCESSING)
+    buffered = np.fromiter(sim.buffer, dtype=np.int64, count=len(sim.buffer))
+    return {
+        'time': sim.time,
+        'active': np.flatnonzero(sim.user_active).astype(np.int32),
+        'tx_users': table.user_id[transmitting].astype(np.int32),
+        'tx_progress': table.transmission_progress[transmitting].astype(np.float32),
+        'buffer_users': table.user_id[buffered].astype(np.int32),
+        'proc_users': table.user_id[processing].astype(np.int32),
+        'proc_x': table.position_x[processing].astype(np.float32),
+        'packets': len(table),
+        'active_users': sim.current_active_users,
+        'utilization': sim.current_utilization,
+        'throughput': sim.current_throughput,
+        'loss_rate': sim.current_loss_rate,
+        'delay_p50': sim.end_to_end_delay.quantile(0.5),
+        'delay_p99': sim.end_to_end_delay.quantile(0.99),
+        'buffer_occupancy': sim.current_buffer_occupancy,
+        'processed': sim.processed_packets,
+        'dropped': sim.dropped_packets,
+    }
+
+def layout_view(view):
+    plt.figure(view.fig.number)
+    plt.tight_layout()
+    plt.subplots_adjust(top=0.92, hspace=0.3, wspace=0.3)
+
+# ---------- Offline export ----------
+FRAME_NAME = "frame_%07d.png"
+_export_view = None
+
+def _init_export_worker(N, p, link, dpi, max_buffer_size=50):
+    """Build one Agg view per worker process and cache its static background."""
+    global _export_view
+    plt.switch_backend('Agg')
+    view = RealisticPacketSwitch(N, p, link=link, max_buffer_size=max_buffer_size)
+    view.fig.set_dpi(dpi)
+    layout_view(view)
+    for artist in [*view.animated_artists(), view.active_markers, view.packet_markers, *view.active_labels]:
+        artist.set_animated(True)
+    view.fig.canvas.draw()
+    view.background = view.fig.canvas.copy_from_bbox(view.fig.bbox)
+    _export_view = view
+
+def _render_frames(task):
+    """Render a contiguous run of snapshots to numbered PNG frames (blitting onto the cached background)."""
+    first, snapshots, frame_dir = task
+    view = _export_view
+    canvas = view.fig.canvas
+    for index, snap in enumerate(snapshots, first):
+        view.draw_snapshot(snap)
+        canvas.restore_region(view.background)
+        for artist in view.animated_artists():
+            view.fig.draw_artist(artist)
+        frame = Image.fromarray(np.asarray(canvas.buffer_rgba())).convert('RGB')
+        frame.save(os.path.join(frame_dir, FRAME_NAME % index), compress_level=1)
+    return len(snapshots)
+
+def record_snapshots(N, p=0.1, frames=500, seed=None, link=DEFAULT_LINK, trace_path=None, mean_on_time=None,
+                     max_buffer_size=50):
+    """Run the headless core for `frames` steps and return one frame_snapshot per step.
+
+    With trace_path the run is also recorded and saved as a replayable trace.
+    """
+    sim = PacketSwitchCore(N, p, seed=seed, max_buffer_size=max_buffer_size, link=link, mean_on_time=mean_on_time)
+    recorder = sim.start_recording() if trace_path else None
+    snapshots = []
+    for _ in range(frames):
+        sim.step()
+        snapshots.append(frame_snapshot(sim))
+    if recorder is not None:
+        recorder.trace().save(trace_path)
+    return snapshots
+
+def replay_snapshots(trace):
+    """Frame snapshots of a recorded run, re-simulated deterministically from its seed."""
+    snapshots = []
+    replay(trace, on_step=lambda sim, step: snapshots.append(frame_snapshot(sim)))
+    return snapshots
+
+def export_simulation(path, N, p=0.1, frames=500, fps=25, seed=None, link=DEFAULT_LINK, workers=None, dpi=80,
+                      snapshots=None, trace_path=None, progress=True, mean_on_time=None, max_buffer_size=50):
+    """Render a simulation to an MP4 or GIF file (by extension) without a display.
+
+    The simulation runs headlessly first and records a snapshot per frame;
+    contiguous runs of frames are then drawn in parallel worker processes
+    (Agg, blitted onto a cached background) and the frames are encoded in
+    order. MP4 needs an ffmpeg executable; GIF uses Pillow and keeps every
+    frame in memory while encoding, so it suits short clips.
+    """
+    fmt = os.path.splitext(path)[1].lower()
+    if fmt not in (".mp4", ".gif"):
+        raise ValueError(f"unsupported export format {fmt!r}; use .mp4 or .gif")
+    ffmpeg = shutil.which(plt.rcParams['animation.ffmpeg_path'])
+    if fmt == ".mp4" and ffmpeg is None:
+        raise RuntimeError("MP4 export needs ffmpeg on PATH (or rcParams['animation.ffmpeg_path']); use .gif instead")
+    # Output directories first: record_snapshots saves the trace before any frame is rendered
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if trace_path:
+        os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+    if snapshots is None:
+        snapshots = record_snapshots(N, p, frames, seed, link, trace_path, mean_on_time, max_buffer_size)
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, -(-len(snapshots) // (workers * 4)))
+
+    with tempfile.TemporaryDirectory() as frame_dir:
+        tasks = [(i, snapshots[i:i+chunk], frame_dir) for i in range(0, len(snapshots), chunk)]
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_export_worker,
+                                 initargs=(N, p, link, dpi, max_buffer_size)) as pool:
+            for count in pool.map(_render_frames, tasks):
+                done += count
+                if progress:
+                    print(f"\r🎞️  Rendered {done}/{len(snapshots)} frames", end="", flush=True)
+        if progress:
+            print()
+        frame_paths = [os.path.join(frame_dir, FRAME_NAME % i) for i in range(len(snapshots))]
+        if fmt == ".gif":
+            first = Image.open(frame_paths[0])
+            first.save(path, save_all=True, append_images=(Image.open(f) for f in frame_paths[1:]),
+                       duration=1000 / fps, loop=0)
+        else:
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps),
+                            '-i', os.path.join(frame_dir, FRAME_NAME), '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', path], check=True)
+    if progress:
+        print(f"💾 Saved {path}")
+    return path
+
+def run_comparison_simulations(link=DEFAULT_LINK, profile=False, export=None, frames=500, fps=25, seed=None,
+                               workers=None, record=False, mean_on_time=None):
+    """Run simulations for different user counts.
+
+    With export="mp4" or "gif" each run is rendered headlessly to
+    outputs/packet_switch_n_<N>.<export> instead of being shown; with
+    profile=True each interactive run writes a phase trace to outputs/;
+    with record=True each run is saved as a replayable outputs/trace_n_<N>.npz.
+    mean_on_time (seconds) switches users to the Markov on/off model.
+    """
     scenarios = [
         (10, 0.1, "N=10 (Optimal)"),
         (35, 0.1, "N=35 (Good)"), 
@@ -448,53 +463,118 @@ def run_comparison_simulations():
         print(f"{'='*70}")
         
         # Calculate theoretical probabilities
-        prob_more_than_10 = 1 - binom.cdf(10, N, p)
-        max_supported_users = 10
-        prob_overload = 1 - binom.cdf(max_supported_users, N, p)
+        stats = theoretical_probabilities(N, p, link)
+        threshold = stats['threshold']
         
         print(f"📊 Theoretical Analysis:")
-        print(f"   P(X > 10) = {prob_more_than_10:.6f}")
-        print(f"   P(Overload) = {prob_overload:.6f}")
-        print(f"   Expected active users: {N * p:.1f}")
-        print(f"   Max supported users: {max_supported_users}")
-        
+        if threshold is not None:
+            print(f"   P(X > {threshold}) = {stats['prob_over_threshold']:.6f}")
+        print(f"   P(Overload) = {stats['prob_overload']:.6f}")
+        print(f"   Expected active users: {stats['expected_active']:.1f}")
+        if stats['max_supported_users'] is not None:
+            print(f"   Max supported users: {stats['max_supported_users']:g}")
+        if mean_on_time is not None and threshold is not None:
+            periods = overload_statistics(N, threshold, p, mean_on_time)
+            print(f"   Mean overload period: {periods['mean_overload_s']:.2f}s "
+                  f"(i.i.d. users: {periods['iid_mean_overload_s']:.2f}s)")
+        
+        trace_path = os.path.join("outputs", f"trace_n_{N}.npz") if record else None
+        if export:
+            export_simulation(os.path.join("outputs", f"packet_switch_n_{N}.{export}"), N, p, frames=frames, fps=fps,
+                              seed=seed, link=link, workers=workers, trace_path=trace_path, mean_on_time=mean_on_time)
+            continue
+
         # Create and run simulation
-        sim = RealisticPacketSwitch(N, p)
+        sim = RealisticPacketSwitch(N, p, seed=seed, link=link, mean_on_time=mean_on_time)
+        if record:
+            sim.start_recording()
+        if profile:
+            sim.enable_profiling(capture=(50, 150), trace_memory=True)
         
         # Create animation
         anim = animation.FuncAnimation(
-            sim.fig, sim.update, frames=500, interval=40, blit=False, repeat=True
+            sim.fig, sim.update, frames=frames, interval=1000 / fps, blit=True, repeat=True
         )
         
-        plt.tight_layout()
-        plt.subplots_adjust(top=0.92, hspace=0.3, wspace=0.3)
+        layout_view(sim)
         plt.show()
 
+        if record:
+            os.makedirs("outputs", exist_ok=True)
+            sim.recorder.trace().save(trace_path)
+            print(f"💾 Saved trace: {trace_path}")
+
+        if profile:
+            os.makedirs("outputs", exist_ok=True)
+            sim.profiler.stop_capture()  # the window is still open if the animation closed early
+            sim.profiler.to_json(os.path.join("outputs", f"profile_n_{N}.json"))
+            sim.profiler.to_chrome_trace(os.path.join("outputs", f"profile_n_{N}.trace.json"))
+            print(f"⏱️  Phase timings for N={N}:")
+            print(sim.profiler.report())
+
+def replay_simulation(trace_path, export=None, fps=25, workers=None):
+    """Show a recorded run again, or render it to outputs/ with export="mp4"/"gif"."""
+    trace = SimulationTrace.load(trace_path)
+    meta = trace.meta
+    if export:
+        name = os.path.splitext(os.path.basename(trace_path.rstrip("/")))[0]
+        return export_simulation(os.path.join("outputs", f"{name}.{export}"), meta['N_users'], meta['user_active_prob'],
+                                 fps=fps, link=link_from_meta(meta), workers=workers,
+                                 snapshots=replay_snapshots(trace), max_buffer_size=meta['max_buffer_size'])
+    sim = simulation_from_meta(meta, cls=RealisticPacketSwitch)
+    anim = animation.FuncAnimation(sim.fig, sim.update, frames=len(trace), interval=1000 / fps, blit=True,
+                                   repeat=False)
+    layout_view(sim)
+    plt.show()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Animated packet switching simulations.")
+    parser.add_argument('--profile', action='store_true', help="write per-phase timing traces to outputs/")
+    parser.add_argument('--export', choices=['mp4', 'gif'], default=None,
+                        help="render each scenario to a video file instead of showing it (no display needed)")
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--fps', type=float, default=25)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help="frame rendering processes (export only)")
+    parser.add_argument('--record', action='store_true', help="save each run as a replayable trace in outputs/")
+    parser.add_argument('--replay', default=None, help="show (or with --export, render) a recorded trace and exit")
+    parser.add_argument('--mean-on', type=float, default=None,
+                        help="mean session length in seconds: Markov on/off users instead of independent redraws")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay_simulation(args.replay, export=args.export, fps=args.fps, workers=args.workers)
+        raise SystemExit
+
     print("🎯 REALISTIC PACKET SWITCHING SIMULATION")
     print("=" * 70)
     
+    threshold = DEFAULT_LINK.threshold_users
+    
     # Show probability comparison table
     print("\n📋 PROBABILITY COMPARISON:")
     print("┌─────────┬───────────────┬─────────────────┬──────────────┐")
-    print("│ N Users │   P(X > 10)   │ Expected Active │    Status    │")
+    print(f"│ N Users │ {f'P(X > {threshold})':^13} │ Expected Active │    Status    │")
     print("├─────────┼───────────────┼─────────────────┼──────────────┤")
     
     for N in [10, 35, 50, 100]:
         p = 0.1
-        prob_more_than_10 = 1 - binom.cdf(10, N, p)
+        prob_over_threshold = binom.sf(threshold, N, p)
         expected_active = N * p
-        status = "🔴 OVERLOAD" if expected_active > 10 else "🟢 SAFE"
+        status = "🔴 OVERLOAD" if expected_active > threshold else "🟢 SAFE"
         
-        print(f"│ {N:7} │ {prob_more_than_10:13.6f} │ {expected_active:15.1f} │ {status:12} │")
+        print(f"│ {N:7} │ {prob_over_threshold:13.6f} │ {expected_active:15.1f} │ {status:12} │")
     
     print("└─────────┴───────────────┴─────────────────┴──────────────┘")
     
     print("\n📍 Key Insights:")
-    print("   • P(X>10) shows probability of exceeding capacity")
-    print("   • System overloads when expected users > 10")
+    print(f"   • P(X>{threshold}) shows probability of exceeding capacity")
+    print(f"   • System overloads when expected users > {threshold}")
     print("   • Packet loss occurs during overload conditions")
     print("   • Watch the buffer fill up during high load!")
     
-    input("\n🎬 Press Enter to start animations...")
-    run_comparison_simulations()
\ No newline at end of file
+    if not args.export:
+        input("\n🎬 Press Enter to start animations...")
+    run_comparison_simulations(profile=args.profile, export=args.export, frames=args.frames, fps=args.fps,
+                               seed=args.seed, workers=args.workers, record=args.record,
+                               mean_on_time=args.mean_on)
\ No newline at end of file
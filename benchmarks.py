@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import numpy as np
+import scipy
+import pandas as pd
+
+import network_analysis as na
+from packet_switch import PacketSwitchCore
+from topology import Topology, TopologySimulation
+from buffer_model import buffer_model_grid
+
+OUTPUT_DIR = "outputs"
+RESULTS_PATH = os.path.join(OUTPUT_DIR, "benchmarks.json")
+BASELINE_PATH = os.path.join(OUTPUT_DIR, "benchmark_baseline.json")
+SEED = 12345
+
+# ---------- Registry ----------
+BENCHMARKS = []
+
+def benchmark(name, params=(None,)):
+    """Register fn(param) as a benchmark for each param.
+
+    fn returns the callable to time, or (prepare, run) when every timed call
+    needs untimed preparation first. Setup inside fn itself is never timed.
+    """
+    def register(fn):
+        for param in params:
+            BENCHMARKS.append((name if param is None else f"{name}[{param}]", fn, param))
+        return fn
+    return register
+
+# ---------- Analytical paths ----------
+@benchmark("binomial_tail_prob", params=(200, 2_000, 20_000))
+def bench_binomial_tail_prob(max_n):
+    ns = range(1, max_n + 1)
+    def run():
+        for n in ns:
+            na.binomial_tail_prob(n, na.THRESHOLD_USERS, na.DEFAULT_P)
+    # Clear the LRU so every call is computed, not looked up
+    return na.binomial_tail_prob.cache_clear, run
+
+@benchmark("log_tail_prob", params=(20_000, 1_000_000))
+def bench_log_tail_prob(max_n):
+    ns = np.arange(1, max_n + 1)
+    return lambda: na.log_tail_prob(ns, na.THRESHOLD_USERS, na.DEFAULT_P)
+
+@benchmark("heatmap_grid", params=(200, 2_000, 20_000))
+def bench_heatmap_grid(n_max):
+    # Same grid as plot_heatmap, computed without the on-disk cache
+    p_grid = np.linspace(0.01, 0.3, 30)
+    n_grid = np.arange(1, n_max + 1)
+    return lambda: na.tail_prob_grid(n_grid, p_grid, na.THRESHOLD_USERS)
+
+@benchmark("monte_carlo_tail", params=(10_000, 100_000, 1_000_000))
+def bench_monte_carlo_tail(trials):
+    def run():
+        na.monte_carlo_tail(50, na.THRESHOLD_USERS, na.DEFAULT_P, trials=trials, rng=np.random.default_rng(SEED))
+    return run
+
+@benchmark("verify_theoretical_vs_montecarlo")
+def bench_verify(_):
+    return lambda: na.verify_theoretical_vs_montecarlo([35, 50, 100], p=na.DEFAULT_P, trials=200_000)
+
+@benchmark("buffer_model_grid", params=('direct', 'power'))
+def bench_buffer_model_grid(method):
+    return lambda: buffer_model_grid([50, 100, 110, 120], [10, 20, 50, 100, 200], method=method)
+
+# ---------- Simulation paths ----------
+@benchmark("update_packets", params=(10, 100, 1_000, 10_000))
+def bench_update_packets(n_users):
+    sim = PacketSwitchCore(n_users, na.DEFAULT_P, seed=SEED)
+    for _ in range(50):  # reach a populated steady state before timing
+        sim.step()
+    state = {}
+    def prepare():
+        sim.time += sim.dt
+        state['active'] = sim.update_users()
+    return prepare, lambda: sim.update_packets(state['active'])
+
+@benchmark("simulation_step", params=(10, 1_000, 10_000))
+def bench_step(n_users):
+    sim = PacketSwitchCore(n_users, na.DEFAULT_P, seed=SEED)
+    for _ in range(50):
+        sim.step()
+    return sim.step
+
+@benchmark("topology_step", params=(100, 1_000, 10_000))
+def bench_topology_step(n_links):
+    # Random tree with 20 users per link on average
+    rng = np.random.default_rng(SEED)
+    parent = np.concatenate([[-1], rng.integers(0, np.arange(1, n_links))])
+    topo = Topology(parent, rng.uniform(500, 5000, n_links), 50, rng.integers(0, n_links, 20 * n_links),
+                    user_activity=na.DEFAULT_P)
+    sim = TopologySimulation(topo, seed=SEED)
+    for _ in range(50):
+        sim.step()
+    return sim.step
+
+# ---------- Runner ----------
+def time_benchmark(fn, param, min_time=0.2, min_repeat=3, max_repeat=50, sample_time=0.005):
+    """Time one benchmark: repeat until min_time has been spent (bounded by the repeat limits).
+
+    Calls without a prepare step are looped `number` times per sample, with
+    number doubled until a sample takes sample_time, so sub-millisecond paths
+    are not dominated by timer resolution. Times are per call.
+    """
+    target = fn(param)
+    prepare, run = target if isinstance(target, tuple) else (None, target)
+    number = 1
+    if prepare is None:
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            if time.perf_counter() - start >= sample_time or number >= 1 << 16:
+                break
+            number *= 2
+    samples = []
+    spent = 0.0
+    while len(samples) < max_repeat and (len(samples) < min_repeat or spent < min_time):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed / number)
+        spent += elapsed
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': len(samples),
+        'number': number,
+    }
+
+def run_benchmarks(pattern=None, min_time=0.2, progress=True):
+    """Run every registered benchmark whose name contains pattern; returns the JSON-ready results dict."""
+    na.CACHE_ENABLED = False
+    results = {}
+    for name, fn, param in BENCHMARKS:
+        if pattern and pattern not in name:
+            continue
+        results[name] = time_benchmark(fn, param, min_time=min_time)
+        if progress:
+            r = results[name]
+            print(f"{name:45s} median {r['median']*1e3:10.3f} ms  (min {r['min']*1e3:.3f} ms, n={r['repeat']})", flush=True)
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, tolerance=0.2):
+    """Median time of each benchmark against the baseline; ratio > 1 + tolerance is flagged as a regression."""
+    rows = []
+    for name, r in current['results'].items():
+        base = baseline['results'].get(name)
+        ratio = r['median'] / base['median'] if base else np.nan
+        if not base:
+            status = "new"
+        elif ratio > 1 + tolerance:
+            status = "REGRESSION"
+        elif ratio < 1 / (1 + tolerance):
+            status = "faster"
+        else:
+            status = "same"
+        rows.append({'benchmark': name,
+                     'baseline_ms': base['median'] * 1e3 if base else np.nan,
+                     'current_ms': r['median'] * 1e3,
+                     'ratio': ratio,
+                     'status': status})
+    return pd.DataFrame(rows)
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analytical and simulation hot paths.")
+    parser.add_argument('-k', '--filter', default=None, help="only run benchmarks whose name contains this")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds to spend per benchmark (at least 3 runs)")
+    parser.add_argument('--out', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="results file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative slowdown reported as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.filter, min_time=args.min_time)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"Saved results: {args.out}")
+
+    regressions = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        df = compare(current, baseline, args.tolerance)
+        print(f"\nCompared with {args.baseline} ({baseline['meta']['timestamp']}):")
+        print(df.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        regressions = int((df['status'] == "REGRESSION").sum())
+    if args.save_baseline:
+        # A filtered run only replaces the benchmarks it measured
+        if args.filter and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                merged = json.load(f)
+            merged['results'].update(current['results'])
+            merged['meta'] = current['meta']
+        else:
+            merged = current
+        with open(args.baseline, 'w') as f:
+            json.dump(merged, f, indent=2)
+        print(f"Saved baseline: {args.baseline}")
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+    return current
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
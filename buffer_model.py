@@ -0,0 +1,195 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+from scipy.stats import binom
+
+PACKET_PROB = 0.7   # chance an active user sends a packet in a step (PacketSwitchCore.update_users)
+
+# ---------- Arrival process ----------
+def arrival_pmf(N, p, packet_prob=PACKET_PROB, tol=1e-16):
+    """Distribution of packets reaching the buffer per step: Bin(N, p * packet_prob), tail below tol dropped.
+
+    Packets finish transmitting in the step they are created (a 1500-byte
+    packet needs 12 kbit, far less than a user sends per step), so this is
+    also the per-step arrival count at the buffer.
+    """
+    support = int(binom.isf(tol, N, p * packet_prob)) + 1 if tol > 0 else N
+    return binom.pmf(np.arange(min(support, N) + 1), N, p * packet_prob)
+
+# ---------- Transition structure ----------
+class BufferChain:
+    """Buffer occupancy after service as a DTMC, shared by every buffer size for one arrival process.
+
+    With q packets left after service, a step admits arrivals up to the
+    buffer size B and then serves up to `capacity`:
+    q' = max(min(q + A, B) - capacity, 0), so q ranges over 0..B - capacity.
+    A buffer smaller than `capacity` always empties, leaving the single state
+    q = 0 and a loss of E[(A - B)+] per step.
+    Interior entries P[q, j] = a[j + capacity - q] are the same for every B;
+    only the first column (empty buffer) and the last one (full buffer)
+    depend on B, and both are read off the arrival CDF. The index pattern
+    is built once for the largest buffer and sliced for smaller ones.
+    """
+
+    def __init__(self, pmf, capacity=8, max_buffer=50):
+        self.pmf = np.asarray(pmf, dtype=float)
+        self.cdf = np.cumsum(self.pmf)
+        self.capacity = capacity
+        self.max_buffer = max_buffer
+        n = self.states(max_buffer)
+        rows, offsets = np.divmod(np.arange(n * self.pmf.size), self.pmf.size)
+        cols = rows + offsets - capacity
+        keep = (cols > 0) & (self.pmf[offsets] > 0)
+        self.rows, self.cols, self.vals = rows[keep], cols[keep], self.pmf[offsets[keep]]
+
+    def states(self, buffer_size):
+        if buffer_size < 0:
+            raise ValueError(f"buffer_size must be non-negative, got {buffer_size}")
+        return max(buffer_size - self.capacity, 0) + 1
+
+    def transition_matrix(self, buffer_size):
+        """Sparse transition matrix for one buffer size (CSR, rows sum to 1)."""
+        if buffer_size > self.max_buffer:
+            raise ValueError(f"buffer_size {buffer_size} exceeds max_buffer {self.max_buffer}")
+        n = self.states(buffer_size)
+        q = np.arange(n)
+        inner = (self.rows < n) & (self.cols < n - 1)
+        # Empty after service: at most capacity - q arrivals; full: at least n - 1 + capacity - q
+        empty = self.cdf_at(self.capacity - q)
+        full = 1 - self.cdf_at(n - 2 + self.capacity - q)
+        if n == 1:
+            return sparse.csr_matrix(np.ones((1, 1)))
+        rows = np.concatenate([self.rows[inner], q, q])
+        cols = np.concatenate([self.cols[inner], np.zeros(n, dtype=np.int64), np.full(n, n - 1)])
+        vals = np.concatenate([self.vals[inner], empty, full])
+        return sparse.csr_matrix((vals, (rows, cols)), shape=(n, n))
+
+    def cdf_at(self, k):
+        k = np.asarray(k)
+        return np.where(k < 0, 0.0, self.cdf[np.clip(k, 0, self.cdf.size - 1)])
+
+# ---------- Stationary solution ----------
+def stationary_direct(P):
+    """Stationary distribution from the sparse system pi (P - I) = 0, sum(pi) = 1 (one equation replaced)."""
+    n = P.shape[0]
+    A = sparse.vstack([np.ones((1, n)), (P.T - sparse.identity(n, format='csr')).tocsr()[1:]], format='csc')
+    b = np.zeros(n)
+    b[0] = 1
+    pi = spsolve(A, b)
+    return np.clip(pi, 0, None) / np.clip(pi, 0, None).sum()
+
+def stationary_power(chain, buffer_sizes, tol=1e-12, max_iter=200_000):
+    """Stationary distributions for several buffer sizes at once by power iteration.
+
+    All buffer sizes share the largest buffer's matrix: a step from a
+    distribution on 0..n_k - 1 is pi @ P_max followed by folding the mass at
+    or above n_k - 1 into state n_k - 1, which is exactly the smaller
+    chain's step. Returns an array (len(buffer_sizes), n_max), zero-padded.
+    """
+    sizes = np.asarray(buffer_sizes)
+    n = np.array([chain.states(b) for b in sizes])
+    P = chain.transition_matrix(max(sizes.max(), chain.capacity))
+    width = P.shape[0]
+    PT = P.T.tocsr()
+    columns = np.arange(width)
+    inside = columns[None, :] < (n - 1)[:, None]
+    pi = np.where(columns[None, :] < n[:, None], 1.0, 0.0) / n[:, None]
+    for _ in range(max_iter):
+        nxt = (PT @ pi.T).T
+        tail = np.where(inside, 0.0, nxt).sum(axis=1)
+        nxt = np.where(inside, nxt, 0.0)
+        nxt[np.arange(len(n)), n - 1] = tail
+        if np.abs(nxt - pi).sum(axis=1).max() < tol:
+            return nxt
+        pi = nxt
+    return pi
+
+# ---------- Metrics ----------
+def queue_metrics(pi, pmf, buffer_size, capacity=8, dt=0.05):
+    """Loss, occupancy, throughput and delay for the stationary distribution pi of q (after service)."""
+    pi = np.asarray(pi, dtype=float)
+    q = np.arange(pi.size)
+    a = np.asarray(pmf, dtype=float)
+    # Occupancy before service for every (q, arrivals) pair
+    total = q[:, None] + np.arange(a.size)[None, :]
+    weight = pi[:, None] * a[None, :]
+    admitted = np.minimum(total, buffer_size)
+    lost = float((weight * (total - admitted)).sum())
+    served = float((weight * np.minimum(admitted, capacity)).sum())
+    arrivals = float((np.arange(a.size) * a).sum())
+    mean_queue = float((q * pi).sum())
+    return {
+        'loss_rate': lost / arrivals * 100 if arrivals else 0.0,
+        'mean_occupancy': mean_queue,
+        'buffer_occupancy': mean_queue / buffer_size * 100 if buffer_size else 0.0,
+        'throughput_pkts': served,
+        'utilization': served / capacity * 100,
+        'prob_full': float(weight[admitted == buffer_size].sum()),
+        # Little's law: packets left waiting after service / packets served per step
+        'mean_delay_s': mean_queue / served * dt if served else 0.0,
+    }
+
+def buffer_model_grid(ns, buffer_sizes, p=0.1, capacity=8, packet_prob=PACKET_PROB, dt=0.05, method='direct'):
+    """Stationary loss, occupancy and delay for every (N, buffer size) pair, as a DataFrame.
+
+    The arrival distribution and transition structure are built once per N
+    and reused for every buffer size; method='direct' solves each chain
+    with a sparse LU, method='power' iterates all buffer sizes together.
+    """
+    rows = []
+    buffer_sizes = np.asarray(buffer_sizes)
+    for N in ns:
+        pmf = arrival_pmf(N, p, packet_prob)
+        chain = BufferChain(pmf, capacity, int(buffer_sizes.max()))
+        if method == 'power':
+            dists = stationary_power(chain, buffer_sizes)
+        elif method == 'direct':
+            dists = [stationary_direct(chain.transition_matrix(int(b))) for b in buffer_sizes]
+        else:
+            raise ValueError(f"unknown method {method!r}; use 'direct' or 'power'")
+        for b, pi in zip(buffer_sizes, dists):
+            row = {'N': N, 'p': p, 'buffer_size': int(b), 'processing_capacity': capacity}
+            row.update(queue_metrics(pi[:chain.states(int(b))], pmf, int(b), capacity, dt))
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+def min_buffer_for_loss(N, target_loss, p=0.1, capacity=8, max_buffer=10_000, packet_prob=PACKET_PROB):
+    """Smallest buffer size with loss rate (%) at or below target_loss, or None if max_buffer is not enough."""
+    pmf = arrival_pmf(N, p, packet_prob)
+    chain = BufferChain(pmf, capacity, max_buffer)
+    loss = lambda b: queue_metrics(stationary_direct(chain.transition_matrix(b)), pmf, b, capacity)['loss_rate']
+    lo, hi = 0, max_buffer
+    if loss(hi) > target_loss:
+        return None
+    # Loss falls monotonically with buffer size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if loss(mid) <= target_loss:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Finite-buffer Markov chain model of the packet switch buffer.")
+    parser.add_argument('--n', type=int, nargs='+', default=[35, 50, 100, 110, 120])
+    parser.add_argument('--buffer', type=int, nargs='+', default=[10, 20, 50, 100, 200])
+    parser.add_argument('--p', type=float, default=0.1)
+    parser.add_argument('--capacity', type=int, default=8, help="packets processed per step")
+    parser.add_argument('--method', choices=['direct', 'power'], default='direct')
+    parser.add_argument('--out', default=None, help="CSV path for the table")
+    args = parser.parse_args(argv)
+
+    df = buffer_model_grid(args.n, args.buffer, args.p, args.capacity, method=args.method)
+    if args.out:
+        df.to_csv(args.out, index=False)
+        print(f"Saved table: {args.out}")
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+    return df
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,157 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.stats import beta, norm
+
+from network_analysis import LINK_CAPACITY_MBPS, USER_RATE_MBPS, DEFAULT_P, log_tail_prob
+
+MAX_USERS = 10**12
+
+# ---------- Inverse solvers ----------
+def threshold_users(link_capacity=LINK_CAPACITY_MBPS, user_rate=USER_RATE_MBPS):
+    """Number of simultaneously active users the link carries (vectorized)."""
+    return np.floor_divide(np.asarray(link_capacity), np.asarray(user_rate)).astype(np.int64)
+
+def max_users_for_sla(p=DEFAULT_P, epsilon=1e-3, link_capacity=LINK_CAPACITY_MBPS, user_rate=USER_RATE_MBPS,
+                      max_users=MAX_USERS):
+    """Largest N with P(Binomial(N, p) > capacity) <= epsilon, for a batch of queries.
+
+    All arguments broadcast against each other. P(X > k) is increasing in N, so
+    each query starts from the normal-approximation solution, expands a bracket
+    geometrically around it and then bisects; every step is one vectorized
+    log-tail evaluation over the queries that are still open, so SLAs far below
+    1e-16 stay meaningful. Results are capped at max_users (e.g. p == 0 or
+    epsilon >= 1).
+    """
+    p, epsilon, k = np.broadcast_arrays(np.asarray(p, dtype=float), np.asarray(epsilon, dtype=float),
+                                        threshold_users(link_capacity, user_rate))
+    shape = p.shape
+    p, epsilon, k = p.ravel(), epsilon.ravel(), k.ravel().astype(float)
+    with np.errstate(divide='ignore'):
+        log_eps = np.log(epsilon)
+
+    def ok(n, idx):
+        return log_tail_prob(n, k[idx], p[idx], floor=log_eps[idx]) <= log_eps[idx]
+
+    # Normal-approximation seed: k + 0.5 = N p + z sqrt(N p (1 - p)), solved for sqrt(N)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = norm.isf(np.clip(epsilon, 1e-300, 1.0))
+        b = z * np.sqrt(p * (1 - p))
+        root = (-b + np.sqrt(b**2 + 4 * p * (k + 0.5))) / (2 * p)
+        seed = np.where(p > 0, np.floor(root**2), max_users)
+    seed = np.clip(np.nan_to_num(seed, nan=k.max()), k, max_users)
+
+    lo = k.copy()                      # P(X > k) = 0 for N <= k, always feasible
+    hi = np.full(p.size, float(max_users) + 1)
+    open_ = (p > 0) & (epsilon < 1)
+    idx = np.flatnonzero(open_)
+    good = ok(seed[idx], idx)
+    lo[idx[good]] = seed[idx[good]]
+    hi[idx[~good]] = seed[idx[~good]]
+
+    # Expand outwards from the seed until the answer is bracketed
+    step = np.maximum(1.0, np.ceil(0.01 * seed))
+    up = idx[good]
+    while up.size:
+        probe = np.minimum(lo[up] + step[up], max_users + 1)
+        feasible = ok(probe, up) & (probe <= max_users)
+        lo[up[feasible]] = probe[feasible]
+        hi[up[~feasible]] = probe[~feasible]
+        step[up] *= 2
+        up = up[feasible]
+    down = idx[~good]
+    while down.size:
+        probe = np.maximum(hi[down] - step[down], k[down])
+        feasible = ok(probe, down) | (probe <= k[down])
+        hi[down[~feasible]] = probe[~feasible]
+        lo[down[feasible]] = probe[feasible]
+        step[down] *= 2
+        down = down[~feasible]
+
+    # Bisect: lo is feasible, hi is infeasible
+    active = idx[hi[idx] - lo[idx] > 1]
+    while active.size:
+        mid = np.floor((lo[active] + hi[active]) / 2)
+        feasible = ok(mid, active)
+        lo[active[feasible]] = mid[feasible]
+        hi[active[~feasible]] = mid[~feasible]
+        active = active[hi[active] - lo[active] > 1]
+
+    lo[~open_ & (p <= 0)] = max_users
+    lo[~open_ & (epsilon >= 1)] = max_users
+    return np.minimum(lo, max_users).astype(np.int64).reshape(shape)
+
+def max_activity_for_sla(n, epsilon=1e-3, link_capacity=LINK_CAPACITY_MBPS, user_rate=USER_RATE_MBPS):
+    """Largest p with P(Binomial(n, p) > capacity) <= epsilon, for a batch of queries.
+
+    Uses P(X > k) = I_p(k + 1, n - k), so the answer is the epsilon quantile of
+    Beta(k + 1, n - k); n <= k never overloads and gives p = 1.
+    """
+    n, epsilon, k = np.broadcast_arrays(np.asarray(n, dtype=float), np.asarray(epsilon, dtype=float),
+                                        threshold_users(link_capacity, user_rate))
+    with np.errstate(invalid='ignore'):
+        p = beta.ppf(np.clip(epsilon, 0.0, 1.0), k + 1, n - k)
+    return np.where(n <= k, 1.0, p)
+
+def plan(queries):
+    """Solve a DataFrame of queries; 'p' rows get max_users, 'N' rows get max_p (NaN for the other kind)."""
+    out = queries.copy()
+    link = np.broadcast_to(np.asarray(out.get('link_capacity', LINK_CAPACITY_MBPS), dtype=float), len(out))
+    rate = np.broadcast_to(np.asarray(out.get('user_rate', USER_RATE_MBPS), dtype=float), len(out))
+    eps = out['epsilon'].to_numpy(dtype=float)
+    if 'p' in out:
+        rows = out['p'].notna().to_numpy()
+        solved = max_users_for_sla(out['p'].to_numpy(dtype=float)[rows], eps[rows], link[rows], rate[rows])
+        if rows.all():
+            out['max_users'] = solved
+        else:
+            out['max_users'] = np.nan
+            out.loc[rows, 'max_users'] = solved
+    if 'N' in out:
+        rows = out['N'].notna().to_numpy()
+        out['max_p'] = np.nan
+        out.loc[rows, 'max_p'] = max_activity_for_sla(out['N'].to_numpy(dtype=float)[rows], eps[rows],
+                                                      link[rows], rate[rows])
+    return out
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capacity planning: admissible users or activity for an overload SLA.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    users = sub.add_parser('users', help="max N for given p and epsilon")
+    users.add_argument('--p', type=float, nargs='+', default=[DEFAULT_P])
+    activity = sub.add_parser('activity', help="max p for given N and epsilon")
+    activity.add_argument('--N', type=int, nargs='+', required=True)
+    batch = sub.add_parser('batch', help="solve a CSV of queries (columns p or N, epsilon, optional link_capacity, user_rate)")
+    batch.add_argument('queries')
+    batch.add_argument('--out', default=None)
+    for p in (users, activity):
+        p.add_argument('--eps', type=float, nargs='+', default=[1e-3])
+        p.add_argument('--link', type=float, default=LINK_CAPACITY_MBPS, help="link capacity (Mb/s)")
+        p.add_argument('--rate', type=float, default=USER_RATE_MBPS, help="per-user rate (Mb/s)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'batch':
+        df = plan(pd.read_csv(args.queries))
+        if args.out:
+            df.to_csv(args.out, index=False)
+            print(f"Saved table: {args.out}")
+        else:
+            print(df.to_string(index=False))
+        return df
+
+    if args.command == 'users':
+        p, eps = np.meshgrid(args.p, args.eps, indexing='ij')
+        df = pd.DataFrame({'p': p.ravel(), 'epsilon': eps.ravel()})
+    else:
+        n, eps = np.meshgrid(args.N, args.eps, indexing='ij')
+        df = pd.DataFrame({'N': n.ravel(), 'epsilon': eps.ravel()})
+    df['link_capacity'] = args.link
+    df['user_rate'] = args.rate
+    df = plan(df)
+    print(df.to_string(index=False))
+    return df
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
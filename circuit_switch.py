@@ -0,0 +1,237 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.stats import binom
+from scipy.special import logsumexp
+
+from link_config import DEFAULT_LINK
+from network_analysis import circuit_switching_capacity
+from onoff_model import transition_probs
+
+# ---------- Blocking formulas ----------
+def erlang_b(traffic, channels):
+    """Erlang-B blocking for offered traffic (Erlangs) on `channels` circuits; broadcasts over arrays.
+
+    Uses the recurrence 1/B(c) = 1 + c / A * 1/B(c - 1), which stays stable
+    for any channel count (1/B only grows, overflowing harmlessly to inf
+    when B underflows). One vector update per channel covers all inputs.
+    """
+    traffic, channels = np.broadcast_arrays(np.asarray(traffic, dtype=float), np.asarray(channels, dtype=np.int64))
+    inv = np.ones(traffic.shape)
+    out = np.where(channels <= 0, 1.0, 0.0)
+    with np.errstate(divide='ignore', over='ignore'):
+        for c in range(1, int(channels.max(initial=0)) + 1):
+            inv = 1 + c / traffic * inv
+            done = channels == c
+            out[done] = 1 / inv[done]
+    return out if out.ndim else float(out)
+
+def engset_time_congestion(sources, channels, beta):
+    """Fraction of time all channels are busy with `sources` users, each offering beta Erlangs while idle.
+
+    This is the truncated binomial P(X = c) with X ~ Bin(sources, beta / (1 + beta))
+    restricted to X <= c, computed with the Erlang-style recurrence
+    1/E(c) = 1 + c / ((n - c + 1) beta) * 1/E(c - 1). Broadcasts over arrays.
+    """
+    sources, channels, beta = np.broadcast_arrays(np.asarray(sources, dtype=np.int64),
+                                                  np.asarray(channels, dtype=np.int64),
+                                                  np.asarray(beta, dtype=float))
+    inv = np.ones(sources.shape)
+    out = np.where(channels <= 0, 1.0, 0.0)
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        for c in range(1, int(channels.max(initial=0)) + 1):
+            inv = 1 + c / ((sources - c + 1) * beta) * inv
+            done = channels == c
+            out[done] = np.where(sources[done] < c, 0.0, 1 / inv[done])
+    return out if out.ndim else float(out)
+
+def engset_blocking(sources, channels, beta):
+    """Call congestion (share of call attempts blocked): time congestion seen by the other sources - 1 users."""
+    return engset_time_congestion(np.asarray(sources) - 1, channels, beta)
+
+def onoff_beta(p):
+    """Offered traffic per idle user for users active a fraction p of the time when never blocked."""
+    return np.asarray(p, dtype=float) / (1 - np.asarray(p, dtype=float))
+
+# ---------- Circuit switch simulation ----------
+class CircuitSwitchCore:
+    """Headless circuit switch: each call holds one dedicated circuit for its whole duration.
+
+    Users follow the same on/off pattern as the packet switch users with
+    Markov sessions: an idle user requests a call with a per-step probability
+    and a call ends with probability dt / mean_holding_time per step, so a
+    never-blocked user is in a call a fraction p of the time. A request is
+    admitted while fewer than `channels` circuits are busy (link capacity
+    divided by the user rate by default) and blocked otherwise; blocked
+    users go back to idle (lost calls cleared). All users are updated with
+    vector draws each step. Slotting makes ends and requests of one step
+    interact, so blocking sits below the Engset value and approaches it as dt
+    shrinks: for N=50, p=0.1 and one-second calls over 20000 s it was about
+    10% low at dt=0.05 and 2-4% low at dt=0.01.
+    """
+
+    def __init__(self, N_users, user_active_prob=0.1, seed=None, mean_holding_time=1.0, channels=None,
+                 link=DEFAULT_LINK, dt=0.05):
+        self.N_users = N_users
+        self.user_active_prob = user_active_prob
+        self.link = link
+        self.channels = int(channels if channels is not None
+                            else circuit_switching_capacity(link.link_capacity_mbps, link.user_rate_mbps))
+        self.mean_holding_time = mean_holding_time
+        self.dt = dt
+        self.rng = np.random.default_rng(seed)
+        self.end_prob, self.request_prob = transition_probs(user_active_prob, mean_holding_time, self.dt)
+
+        # Call state, one entry per user
+        self.in_call = np.zeros(N_users, dtype=bool)
+        self.call_start = np.zeros(N_users)
+        self.time = 0
+
+        # Accounting
+        self.attempts = 0
+        self.admitted_calls = 0
+        self.blocked_calls = 0
+        self.completed_calls = 0
+        self.holding_time_total = 0.0
+        self.busy_area = 0.0       # circuit-seconds in use
+        self.all_busy_time = 0.0
+        self.steps = 0
+
+    def update_calls(self):
+        """End finished calls, then admit new requests in random order while circuits are free."""
+        u = self.rng.random(self.N_users)
+        ending = np.flatnonzero(self.in_call & (u < self.end_prob))
+        requests = np.flatnonzero(~self.in_call & (u < self.request_prob))
+        if ending.size:
+            self.in_call[ending] = False
+            self.completed_calls += int(ending.size)
+            self.holding_time_total += float((self.time - self.call_start[ending]).sum())
+        if requests.size:
+            free = self.channels - int(np.count_nonzero(self.in_call))
+            order = self.rng.permutation(requests)
+            admitted = order[:max(free, 0)]
+            self.in_call[admitted] = True
+            self.call_start[admitted] = self.time
+            self.attempts += int(requests.size)
+            self.admitted_calls += int(admitted.size)
+            self.blocked_calls += int(requests.size - admitted.size)
+
+    def step(self):
+        """Advance by one dt; returns the number of busy circuits."""
+        self.time += self.dt
+        self.update_calls()
+        busy = int(np.count_nonzero(self.in_call))
+        self.busy_area += busy * self.dt
+        self.all_busy_time += self.dt if busy >= self.channels else 0.0
+        self.steps += 1
+        return busy
+
+    def run(self, steps):
+        """Run `steps` steps and return the per-step busy circuits and cumulative blocked calls as arrays."""
+        history = {
+            'time': np.empty(steps),
+            'busy_circuits': np.empty(steps, dtype=np.int64),
+            'blocked_calls': np.empty(steps, dtype=np.int64),
+        }
+        for i in range(steps):
+            history['busy_circuits'][i] = self.step()
+            history['time'][i] = self.time
+            history['blocked_calls'][i] = self.blocked_calls
+        return history
+
+    def summary(self):
+        elapsed = max(self.time, 1e-12)
+        return {
+            'time': self.time,
+            'attempts': self.attempts,
+            'admitted_calls': self.admitted_calls,
+            'blocked_calls': self.blocked_calls,
+            'completed_calls': self.completed_calls,
+            'blocking_rate': (self.blocked_calls / self.attempts * 100) if self.attempts else 0,
+            'time_congestion': self.all_busy_time / elapsed * 100,
+            'carried_erlangs': self.busy_area / elapsed,
+            'utilization': self.busy_area / elapsed / self.channels * 100 if self.channels else 0,
+            'mean_holding_time': self.holding_time_total / self.completed_calls if self.completed_calls else 0.0,
+        }
+
+    def theoretical(self):
+        """Engset call and time congestion (%) for this population, and Erlang-B with the same mean load."""
+        beta = onoff_beta(self.user_active_prob)
+        return {
+            'blocking_rate': engset_blocking(self.N_users, self.channels, beta) * 100,
+            'time_congestion': engset_time_congestion(self.N_users, self.channels, beta) * 100,
+            'erlang_b': erlang_b(self.N_users * self.user_active_prob, self.channels) * 100,
+        }
+
+# ---------- Packet vs circuit comparison ----------
+def compare_switching(ns, p_values, link=DEFAULT_LINK):
+    """Side-by-side PS and CS figures for every (N, p) pair, computed in one vectorized pass.
+
+    Circuit switching: Engset call blocking and circuit utilization on
+    link capacity // user rate circuits. Packet switching: overload
+    probability P(X > threshold), the share of offered traffic above the link
+    capacity (bufferless, i.e. lost without buffering) and link utilization.
+    """
+    N, P = np.meshgrid(np.asarray(ns, dtype=np.int64), np.asarray(p_values, dtype=float), indexing='ij')
+    N, P = N.ravel(), P.ravel()
+    channels = int(circuit_switching_capacity(link.link_capacity_mbps, link.user_rate_mbps))
+    beta = onoff_beta(P)
+
+    # CS: number of calls in progress is Bin(N, p) truncated to the circuits
+    # (normalized in log space: at thousands of users every pmf term up to the circuits underflows)
+    k = np.arange(channels + 1)
+    log_pmf = binom.logpmf(k[None, :], N[:, None], P[:, None])
+    cs_carried = np.exp(log_pmf - logsumexp(log_pmf, axis=1, keepdims=True)) @ k
+
+    # PS: fluid demand X * rate against the link capacity, X ~ Bin(N, p), with
+    # E[(X - m)+] = E[X] - sum_{j < floor(m)} P(X > j) - frac(m) P(X > floor(m)), m = capacity / rate
+    m = link.link_capacity_mbps / link.user_rate_mbps
+    whole = int(np.floor(m))
+    tails = binom.sf(np.arange(whole + 1)[None, :], N[:, None], P[:, None])
+    offered = N * P * link.user_rate_mbps
+    excess = np.clip(N * P - tails[:, :whole].sum(axis=1) - (m - whole) * tails[:, whole], 0, None) * link.user_rate_mbps
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ps_loss = np.where(offered > 0, excess / offered, 0.0)
+    return pd.DataFrame({
+        'N': N,
+        'p': P,
+        'cs_circuits': channels,
+        'cs_blocking': engset_blocking(N, channels, beta),
+        'cs_time_congestion': engset_time_congestion(N, channels, beta),
+        'erlang_b': erlang_b(N * P, channels),
+        'cs_utilization': cs_carried / channels,
+        'ps_overload_prob': binom.sf(link.threshold_users, N, P),
+        'ps_loss': ps_loss,
+        'ps_utilization': (offered - excess) / link.link_capacity_mbps,
+    })
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Packet vs circuit switching: blocking, loss and utilization.")
+    parser.add_argument('--n', type=int, nargs='+', default=[10, 35, 50, 100])
+    parser.add_argument('--p', type=float, nargs='+', default=[0.1])
+    parser.add_argument('--simulate', type=int, default=0, metavar='STEPS',
+                        help="also simulate the circuit switch for this many steps per scenario")
+    parser.add_argument('--mean-holding', type=float, default=1.0, help="mean call duration in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help="CSV path for the table")
+    args = parser.parse_args(argv)
+
+    df = compare_switching(args.n, args.p)
+    if args.simulate:
+        sims = []
+        for n, p in zip(df['N'], df['p']):
+            sim = CircuitSwitchCore(int(n), float(p), seed=args.seed, mean_holding_time=args.mean_holding)
+            sim.run(args.simulate)
+            summary = sim.summary()
+            sims.append((summary['blocking_rate'] / 100, summary['utilization'] / 100))
+        df['sim_cs_blocking'], df['sim_cs_utilization'] = map(list, zip(*sims))
+    if args.out:
+        df.to_csv(args.out, index=False)
+        print(f"Saved table: {args.out}")
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+    return df
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,95 @@
+import math
+import numpy as np
+
+# ---------- Quantile sketch ----------
+class DelaySketch:
+    """Fixed-memory quantile sketch for non-negative delays (HDR-histogram style).
+
+    Values are counted in log-spaced buckets whose width is set by rel_error,
+    so every reported quantile is within rel_error (relative) of the true
+    sample quantile for values in [min_value, max_value]. Smaller values,
+    including 0, share one bucket reported as the smallest value seen; larger
+    ones share the top bucket. Memory is the bucket array (about 1300 int64
+    counts at the defaults) however many values are added, and sketches of
+    the same shape can be merged.
+    """
+
+    def __init__(self, rel_error=0.01, min_value=1e-6, max_value=1e5):
+        self.rel_error = rel_error
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + rel_error) / (1 - rel_error)
+        self.log_gamma = math.log(self.gamma)
+        self.offset = math.floor(math.log(min_value) / self.log_gamma)
+        self.top = math.ceil(math.log(max_value) / self.log_gamma) - self.offset + 1
+        self.counts = np.zeros(self.top + 1, dtype=np.int64)  # bucket 0: below min_value
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def bucket(self, value):
+        if value < self.min_value:
+            return 0
+        return min(math.floor(math.log(value) / self.log_gamma) - self.offset + 1, self.top)
+
+    def add(self, values):
+        """Add an array of delays."""
+        values = np.asarray(values, dtype=float).ravel()
+        if not values.size:
+            return
+        index = np.zeros(values.size, dtype=np.int64)
+        large = values >= self.min_value
+        index[large] = np.minimum(np.floor(np.log(values[large]) / self.log_gamma).astype(np.int64) - self.offset + 1,
+                                  self.top)
+        self.counts += np.bincount(index, minlength=self.counts.size)
+        self.count += values.size
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def add_one(self, value):
+        """Add a single delay (cheaper than add() for scalars)."""
+        self.counts[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if (other.rel_error, other.min_value, other.max_value) != (self.rel_error, self.min_value, self.max_value):
+            raise ValueError("can only merge sketches with the same rel_error, min_value and max_value")
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Delay at quantile q (0..1), or nan when empty."""
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        i = int(np.searchsorted(np.cumsum(self.counts), rank, side='right'))
+        if i == 0:
+            return self.min
+        # Midpoint of the bucket in relative terms: within rel_error of every value in it
+        value = 2 * self.gamma ** (i - 1 + self.offset) * self.gamma / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def percentiles(self, qs=(0.5, 0.99, 0.999)):
+        """{'p50': ..., 'p99': ..., 'p99.9': ...} for the given quantiles."""
+        return {f"p{100 * q:g}": self.quantile(q) for q in qs}
+
+    def summary(self):
+        return {'count': self.count, 'mean': self.mean(), 'min': self.min if self.count else math.nan,
+                'max': self.max if self.count else math.nan, **self.percentiles()}
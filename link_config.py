@@ -0,0 +1,61 @@
+from dataclasses import dataclass, field, replace
+
+@dataclass(frozen=True)
+class UserClass:
+    """A group of identical users: how many, their peak rate and activity probability."""
+    count: int
+    rate_mbps: float
+    activity: float
+    name: str = ""
+
+    def __post_init__(self):
+        if self.count < 0:
+            raise ValueError(f"count must be non-negative, got {self.count}")
+        if self.rate_mbps <= 0:
+            raise ValueError(f"rate_mbps must be positive, got {self.rate_mbps}")
+        if not 0 <= self.activity <= 1:
+            raise ValueError(f"activity must be in [0, 1], got {self.activity}")
+
+@dataclass(frozen=True)
+class LinkConfig:
+    """Immutable description of a shared link and, optionally, its user population.
+
+    threshold_users defaults to link_capacity_mbps // user_rate_mbps, the number
+    of peak-rate users the link carries. user_classes describes a heterogeneous
+    population; when it is empty every user has user_rate_mbps.
+    """
+    link_capacity_mbps: float = 1000
+    user_rate_mbps: float = 100
+    threshold_users: int = None
+    user_classes: tuple = field(default=())
+
+    def __post_init__(self):
+        if self.link_capacity_mbps <= 0 or self.user_rate_mbps <= 0:
+            raise ValueError("link_capacity_mbps and user_rate_mbps must be positive")
+        if self.threshold_users is None:
+            object.__setattr__(self, 'threshold_users', int(self.link_capacity_mbps // self.user_rate_mbps))
+        object.__setattr__(self, 'user_classes', tuple(self.user_classes))
+
+    @property
+    def link_capacity_bps(self):
+        return self.link_capacity_mbps * 1e6
+
+    @property
+    def user_rate_bps(self):
+        return self.user_rate_mbps * 1e6
+
+    @property
+    def total_users(self):
+        return sum(c.count for c in self.user_classes)
+
+    def with_classes(self, *user_classes):
+        """Copy of this link with the given user classes."""
+        return replace(self, user_classes=tuple(user_classes))
+
+    def replace(self, **changes):
+        """Copy with fields changed; threshold_users is re-derived unless given."""
+        if 'threshold_users' not in changes and ({'link_capacity_mbps', 'user_rate_mbps'} & changes.keys()):
+            changes['threshold_users'] = None
+        return replace(self, **changes)
+
+DEFAULT_LINK = LinkConfig()
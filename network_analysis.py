@@ -1,19 +1,33 @@
 import os
 import time
+import gzip
+import json
+import pickle
+import hashlib
+from functools import lru_cache
 import numpy as np
+import scipy
 import pandas as pd
 import matplotlib.pyplot as plt
-from scipy.stats import binom, norm
+from scipy.stats import binom, norm, beta
+from scipy.special import betaln, xlogy, xlog1py, erfcx, logsumexp
+from scipy.signal import fftconvolve
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_pdf import PdfPages
+from concurrent.futures import ProcessPoolExecutor
+
+from link_config import UserClass, DEFAULT_LINK
 
 # ---------- Settings ----------
-LINK_CAPACITY_MBPS = 1000
-USER_RATE_MBPS = 100
-THRESHOLD_USERS = LINK_CAPACITY_MBPS // USER_RATE_MBPS  # = 10
+LINK_CAPACITY_MBPS = DEFAULT_LINK.link_capacity_mbps
+USER_RATE_MBPS = DEFAULT_LINK.user_rate_mbps
+THRESHOLD_USERS = DEFAULT_LINK.threshold_users  # = 10
 DEFAULT_P = 0.1
 
 OUTPUT_DIR = "outputs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
+CACHE_ENABLED = True
 
 # ---------- Utility functions ----------
 def circuit_switching_capacity(link_capacity=LINK_CAPACITY_MBPS, user_rate=USER_RATE_MBPS):
@@ -24,12 +38,155 @@ def binomial_pmf(n, k, p=DEFAULT_P):
     """Stable PMF via scipy.stats.binom."""
     return binom.pmf(k, n, p)
 
+@lru_cache(maxsize=1 << 16)
 def binomial_tail_prob(n, k_threshold, p=DEFAULT_P):
     """P(X > k_threshold) for X ~ Binomial(n,p)."""
     if n <= k_threshold:
         return 0.0
-    # cdf(k) = P(X <= k), so 1 - cdf(k) = P(X > k)
-    return 1.0 - binom.cdf(k_threshold, n, p)
+    # sf(k) = P(X > k) directly; 1 - cdf(k) cancels to 0 once the tail drops below ~1e-16
+    return float(binom.sf(k_threshold, n, p))
+
+def log_tail_prob(n, k_threshold=THRESHOLD_USERS, p=DEFAULT_P, method="exact", floor=None, terms=64):
+    """log P(X > k_threshold) for X ~ Binomial(n,p), vectorized over broadcast n, k, p.
+
+    method="exact" uses binom.logsf; cells where that underflows (tails far
+    below 1e-300) are recomputed as a log-sum of the first `terms` pmf terms
+    from k+1 up plus a geometric bound on the rest, so they stay finite.
+    method="saddlepoint" is the Lugannani-Rice approximation and
+    method="bound" the Chernoff upper bound.
+
+    With floor (a log-probability), cells whose Chernoff bound is already
+    <= floor skip the exact evaluation and return the bound: the answer to
+    "is the tail below exp(floor)?" is the same, at a fraction of the cost.
+    Returns -inf where the tail is exactly 0 (n <= k, or p == 0).
+    """
+    n, k, p = np.broadcast_arrays(np.asarray(n, dtype=float), np.floor(np.asarray(k_threshold, dtype=float)),
+                                  np.asarray(p, dtype=float))
+    if method == "bound":
+        return chernoff_log_bound(n, k, p)
+    if method == "saddlepoint":
+        return saddlepoint_log_tail(n, k, p)
+    if method != "exact":
+        raise ValueError(f"unknown method: {method!r}")
+    if floor is not None:
+        out = np.array(chernoff_log_bound(n, k, p), dtype=float)
+        todo = out > floor
+        out[todo] = log_tail_prob(n[todo], k[todo], p[todo], terms=terms)
+        return out
+    with np.errstate(divide='ignore'):
+        out = np.array(binom.logsf(k, n, p), dtype=float)
+    lost = np.isneginf(out) & (n > k) & (p > 0)
+    if lost.any():
+        out[lost] = _log_tail_by_terms(n[lost], k[lost], p[lost], terms)
+    return out
+
+def _log_tail_by_terms(n, k, p, terms=64):
+    """log P(X > k) as logsumexp of pmf(k+1..k+terms) plus a geometric bound on the remainder (deep upper tail)."""
+    j = k[:, None] + 1 + np.arange(terms)
+    logpmf = binom.logpmf(j, n[:, None], p[:, None])
+    # pmf ratios decrease in j, so the rest is at most last * r / (1 - r) with r the last ratio
+    last = j[:, -1]
+    r = np.clip((n - last) / (last + 1) * p / (1 - p), 0.0, 1 - 1e-12)
+    with np.errstate(divide='ignore'):
+        rest = logpmf[:, -1] + np.log(r) - np.log1p(-r)
+    return np.logaddexp(logsumexp(logpmf, axis=1), rest)
+
+def saddlepoint_log_tail(n, k_threshold=THRESHOLD_USERS, p=DEFAULT_P):
+    """Lugannani-Rice saddlepoint approximation of log P(X > k_threshold), continuity-corrected.
+
+    Closed form and vectorized; used above the mean (x = k + 0.5 > n p), with
+    the exact tail elsewhere. Relative error is about 1% at n = 50 and below
+    0.3% from n = 200 on, and shrinks further as n grows.
+    """
+    n, k, p = np.broadcast_arrays(np.asarray(n, dtype=float), np.floor(np.asarray(k_threshold, dtype=float)),
+                                  np.asarray(p, dtype=float))
+    x = k + 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = x / n
+        # w^2 / 2 = n KL(a || p), s = logit(a) - logit(p), u = 2 sinh(s/2) sqrt(n a (1-a))
+        kl = xlogy(a, a / p) + xlogy(1 - a, (1 - a) / (1 - p))
+        w = np.sqrt(2 * n * kl)
+        s = np.log(a / (1 - a)) - np.log(p / (1 - p))
+        u = 2 * np.sinh(s / 2) * np.sqrt(n * a * (1 - a))
+        # Phi_bar(w) + phi(w) (1/u - 1/w), with phi(w) factored out via the scaled erfc
+        log_phi = -0.5 * w**2 - 0.5 * np.log(2 * np.pi)
+        out = log_phi + np.log(np.sqrt(np.pi / 2) * erfcx(w / np.sqrt(2)) + 1 / u - 1 / w)
+    # Near the mean the expansion is 0/0, and for tiny p it can go negative; use the exact tail there
+    exact = ~((a > p) & (a < 1) & (p > 0) & (w > 0.5) & np.isfinite(out))
+    out = np.array(out, dtype=float)
+    out[exact] = log_tail_prob(n[exact], k[exact], p[exact])
+    return out
+
+def tail_prob_grid(ns, p_values, k_threshold=THRESHOLD_USERS, method="auto", max_cells=1 << 22):
+    """P(X > k_threshold) for every (p, n) pair; returns array of shape (len(p_values), len(ns)).
+
+    method="sf" broadcasts binom.sf over the grid. method="recurrence" uses
+    P(X_{n+1} > k) = P(X_n > k) + p * P(X_n = k) and fills all n = 0..max(ns)
+    with one cumulative sum per p row, which is much cheaper for dense N ranges.
+    "auto" picks the recurrence when ns covers most of 0..max(ns).
+    Work is done in blocks of at most max_cells cells so temporaries stay bounded.
+    """
+    ns = np.asarray(ns)
+    p_values = np.atleast_1d(np.asarray(p_values, dtype=float))
+    k = int(np.floor(k_threshold))
+    H = np.zeros((p_values.size, ns.size))
+    if ns.size == 0 or p_values.size == 0:
+        return H
+    if ns.min() < 0:
+        raise ValueError(f"N must be non-negative, got {ns.min()}")
+    max_n = int(ns.max())
+    if method == "auto":
+        dense = np.issubdtype(ns.dtype, np.integer) and max_n <= 4 * ns.size
+        method = "recurrence" if dense and k >= 0 else "sf"
+
+    if method == "sf":
+        n_block = max(1, min(ns.size, max_cells))
+        p_block = max(1, max_cells // n_block)
+        for i in range(0, p_values.size, p_block):
+            ps = p_values[i:i+p_block, None]
+            for j in range(0, ns.size, n_block):
+                H[i:i+p_block, j:j+n_block] = binom.sf(k, ns[None, j:j+n_block], ps)
+        return H
+    if method != "recurrence":
+        raise ValueError(f"unknown method: {method!r}")
+    if k < 0:
+        H[:] = 1.0
+        return H
+
+    n_block = max(1, min(max_n + 1, max_cells))
+    p_block = max(1, max_cells // n_block)
+    for i in range(0, p_values.size, p_block):
+        tails = np.empty((p_values[i:i+p_block].size, max_n + 1))
+        for block_ns, block in iter_tail_chunks(max_n, p_values[i:i+p_block], k, n_block):
+            tails[:, block_ns] = block
+        H[i:i+p_block] = tails[:, ns]
+    return H
+
+def iter_tail_chunks(n_max, p_values, k_threshold=THRESHOLD_USERS, chunk=1 << 16, n_min=0):
+    """Yield (ns, H) blocks of P(X > k_threshold) for n = n_min..n_max in increasing order.
+
+    H has shape (len(p_values), len(ns)). Uses the recurrence from
+    tail_prob_grid with a running carry between blocks, so memory stays at
+    O(len(p_values) * chunk) however large n_max is.
+    """
+    ps = np.atleast_1d(np.asarray(p_values, dtype=float))[:, None]
+    k = int(np.floor(k_threshold))
+    # tail[n] = p * sum_{m=k}^{n-1} pmf(k; m, p)
+    carry = np.zeros((ps.shape[0], 1))
+    for start in range(0, n_max + 1, chunk):
+        ns = np.arange(start, min(start + chunk, n_max + 1))
+        if k < 0:
+            block = np.ones((ps.shape[0], ns.size))
+        else:
+            m = np.maximum(ns - 1, k).astype(float)
+            log_comb = -np.log(m + 1) - betaln(m - k + 1, k + 1)
+            pmf = np.where(ns > k, np.exp(log_comb + xlogy(k, ps) + xlog1py(m - k, -ps)), 0.0)
+            block = np.cumsum(ps * pmf, axis=1) + carry
+            carry = block[:, -1:]
+            block = np.minimum(block, 1.0)
+        if ns[-1] >= n_min:
+            keep = ns >= n_min
+            yield ns[keep], block[:, keep]
 
 def normal_approx_tail(n, k_threshold, p=DEFAULT_P):
     """Continuity-corrected normal approximation for P(X > k_threshold)."""
@@ -37,9 +194,9 @@ def normal_approx_tail(n, k_threshold, p=DEFAULT_P):
     sigma = np.sqrt(n * p * (1-p))
     if sigma == 0:
         return 0.0 if mu <= k_threshold else 1.0
-    # continuity correction: P(X > k) ≈ 1 - Phi((k + 0.5 - mu)/sigma)
+    # continuity correction: P(X > k) ≈ 1 - Phi((k + 0.5 - mu)/sigma), via sf to keep small tails
     z = (k_threshold + 0.5 - mu) / sigma
-    return 1.0 - norm.cdf(z)
+    return float(norm.sf(z))
 
 def monte_carlo_tail(n, k_threshold, p=DEFAULT_P, trials=100_000, rng=None):
     """Monte Carlo estimate of P(X > k_threshold)."""
@@ -48,179 +205,617 @@ def monte_carlo_tail(n, k_threshold, p=DEFAULT_P, trials=100_000, rng=None):
     samples = rng.binomial(n, p, size=trials)
     return float(np.mean(samples > k_threshold))
 
+def wilson_interval(hits, trials, conf=0.95):
+    """Wilson score interval for a binomial proportion (vectorized)."""
+    hits = np.asarray(hits, dtype=float)
+    trials = np.maximum(np.asarray(trials, dtype=float), 1)
+    z = norm.ppf(0.5 + conf / 2)
+    phat = hits / trials
+    denom = 1 + z**2 / trials
+    centre = (phat + z**2 / (2 * trials)) / denom
+    half = z * np.sqrt(phat * (1 - phat) / trials + z**2 / (4 * trials**2)) / denom
+    return np.maximum(centre - half, 0.0), np.minimum(centre + half, 1.0)
+
+def clopper_pearson_interval(hits, trials, conf=0.95):
+    """Exact (Clopper-Pearson) interval for a binomial proportion (vectorized)."""
+    hits = np.asarray(hits, dtype=float)
+    trials = np.asarray(trials, dtype=float)
+    alpha = 1 - conf
+    with np.errstate(invalid='ignore'):
+        lo = np.where(hits > 0, beta.ppf(alpha / 2, hits, trials - hits + 1), 0.0)
+        hi = np.where(hits < trials, beta.ppf(1 - alpha / 2, hits + 1, trials - hits), 1.0)
+    return lo, hi
+
+def chernoff_log_bound(n, k_threshold, p=DEFAULT_P):
+    """log of the Chernoff bound P(X > k) <= exp(-n KL((k+1)/n || p)); 0 when k+1 <= n*p."""
+    n = np.asarray(n, dtype=float)
+    p = np.asarray(p, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.minimum((np.floor(k_threshold) + 1) / n, 1.0)
+        kl = xlogy(a, a / p) + xlogy(1 - a, (1 - a) / (1 - p))
+        out = np.where(a > p, -n * kl, 0.0)
+    return np.where(n <= k_threshold, -np.inf, out)
+
+def batched_monte_carlo_tail(ns, p_values, k_threshold=THRESHOLD_USERS, rel_err=0.01, conf=0.95,
+                             batch=10_000, max_trials=10_000_000, interval="wilson",
+                             rare_threshold=1e-4, max_cells=1 << 22, rng=None):
+    """Monte Carlo estimate of P(X > k_threshold) for many (n, p) pairs at once.
+
+    All still-running pairs are sampled in one vectorized draw per round; a pair
+    stops once the relative half-width of its confidence interval is below
+    rel_err (or max_trials is reached). Pairs whose Chernoff bound is below
+    rare_threshold are sampled from an exponentially tilted binomial with mean
+    k_threshold + 1 and reweighted by the likelihood ratio (importance sampling),
+    with a normal interval on the weighted mean.
+    Returns a DataFrame with one row per pair.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if interval not in ("wilson", "clopper-pearson"):
+        raise ValueError(f"unknown interval: {interval!r}")
+    ns, ps = np.broadcast_arrays(np.atleast_1d(ns), np.atleast_1d(np.asarray(p_values, dtype=float)))
+    ns = ns.astype(np.int64)
+    ps = ps.astype(float)
+    k = np.floor(k_threshold)
+    z = norm.ppf(0.5 + conf / 2)
+
+    rare = chernoff_log_bound(ns, k, ps) < np.log(rare_threshold)
+    rare &= (ns > k) & (ps > 0)
+    q = np.where(rare, np.minimum((k + 1) / np.maximum(ns, 1), 1.0), ps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_up = np.where(rare, np.log(ps) - np.log(q), 0.0)
+        log_down = np.where(rare, np.log1p(-ps) - np.log1p(-np.minimum(q, 1 - 1e-15)), 0.0)
+
+    trials = np.zeros(ns.size, dtype=np.int64)
+    hits = np.zeros(ns.size, dtype=np.int64)
+    sum_w = np.zeros(ns.size)
+    sum_w2 = np.zeros(ns.size)
+    est = np.zeros(ns.size)
+    lo = np.zeros(ns.size)
+    hi = np.zeros(ns.size)
+    active = ns > k
+
+    while active.any():
+        idx = np.flatnonzero(active)
+        per = int(max(1, min(batch, max_cells // idx.size)))
+        x = rng.binomial(ns[idx, None], q[idx, None], size=(idx.size, per))
+        hit = x > k
+        w = np.where(hit, np.exp(x * log_up[idx, None] + (ns[idx, None] - x) * log_down[idx, None]), 0.0)
+        trials[idx] += per
+        hits[idx] += hit.sum(axis=1)
+        sum_w[idx] += w.sum(axis=1)
+        sum_w2[idx] += (w * w).sum(axis=1)
+
+        t = trials[idx]
+        est[idx] = sum_w[idx] / t
+        plain = idx[~rare[idx]]
+        if plain.size:
+            bounds = wilson_interval if interval == "wilson" else clopper_pearson_interval
+            lo[plain], hi[plain] = bounds(hits[plain], trials[plain], conf)
+        tilted = idx[rare[idx]]
+        if tilted.size:
+            var = np.maximum(sum_w2[tilted] / trials[tilted] - est[tilted]**2, 0.0)
+            se = np.sqrt(var / trials[tilted])
+            lo[tilted] = np.maximum(est[tilted] - z * se, 0.0)
+            hi[tilted] = est[tilted] + z * se
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = np.where(est[idx] > 0, (hi[idx] - lo[idx]) / (2 * est[idx]), np.inf)
+        done = ((rel <= rel_err) & (hits[idx] > 0)) | (trials[idx] >= max_trials)
+        active[idx[done]] = False
+
+    return pd.DataFrame({
+        'N': ns, 'p': ps, 'monte_carlo': est, 'ci_low': lo, 'ci_high': hi,
+        'trials': trials, 'method': np.where(rare, 'importance', 'plain'),
+    })
+
+# ---------- Result cache ----------
+def cache_key(name, **params):
+    """Content hash of a computation: function name, parameters and library versions."""
+    payload = {'name': name, 'params': params, 'numpy': np.__version__, 'scipy': scipy.__version__}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:24]
+
+def tail_row_path(p, k_threshold=THRESHOLD_USERS):
+    key = cache_key("tail_prob_grid", k_threshold=int(np.floor(k_threshold)), p=float(p).hex())
+    return os.path.join(CACHE_DIR, f"tail_row-{key}.npy")
+
+def cached_tail_row(path, max_n):
+    """Memory-mapped cached row covering N = 0..max_n, or None if there is none that long."""
+    if os.path.exists(path):
+        row = np.load(path, mmap_mode='r')
+        if row.size > max_n:
+            return row
+    return None
+
+def cached_tail_grid(ns, p_values, k_threshold=THRESHOLD_USERS):
+    """tail_prob_grid backed by an on-disk .npy cache in CACHE_DIR.
+
+    Each p is cached as one row of P(X > k) for N = 0..max_n, keyed on
+    (function, threshold, p, library versions). A later request for any N range
+    inside a cached row is sliced from it, so overlapping runs reuse earlier
+    work; a longer range recomputes and replaces the row.
+    """
+    ns = np.asarray(ns)
+    p_values = np.atleast_1d(np.asarray(p_values, dtype=float))
+    dense = ns.size and np.issubdtype(ns.dtype, np.integer) and ns.min() >= 0 and ns.max() <= 4 * ns.size
+    if not CACHE_ENABLED or not dense:
+        return tail_prob_grid(ns, p_values, k_threshold)
+
+    max_n = int(ns.max())
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    paths = [tail_row_path(p, k_threshold) for p in p_values]
+    rows = [cached_tail_row(path, max_n) for path in paths]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        fresh = tail_prob_grid(np.arange(max_n + 1), p_values[missing], k_threshold)
+        for i, row in zip(missing, fresh):
+            tmp = paths[i] + f".{os.getpid()}.tmp.npy"
+            np.save(tmp, row)
+            os.replace(tmp, paths[i])
+            rows[i] = row
+    return np.array([row[ns] for row in rows])
+
+def clear_cache():
+    """Drop the on-disk tail cache and the in-process binomial_tail_prob LRU."""
+    binomial_tail_prob.cache_clear()
+    if os.path.isdir(CACHE_DIR):
+        for fname in os.listdir(CACHE_DIR):
+            if fname.endswith(".npy"):
+                os.remove(os.path.join(CACHE_DIR, fname))
+
+# ---------- Summary export ----------
+def tail_summary_columns(p_values):
+    return ['N'] + [f'P_tail_p={p}' for p in p_values]
+
+def cached_tail_chunks(n_max, p_values, k_threshold=THRESHOLD_USERS, chunk=1 << 16, n_min=0):
+    """iter_tail_chunks that reads through the on-disk cache.
+
+    A range that fits in one chunk goes through cached_tail_grid, so it both
+    reuses and fills the cache. For longer ranges, p values whose cached row
+    already covers n_max are sliced from it chunk by chunk and only the rest
+    are streamed with the recurrence; nothing larger than a chunk is cached.
+    """
+    p_values = np.atleast_1d(np.asarray(p_values, dtype=float))
+    if not CACHE_ENABLED:
+        yield from iter_tail_chunks(n_max, p_values, k_threshold, chunk, n_min)
+        return
+    if n_max < chunk:
+        if n_max >= n_min:
+            ns = np.arange(n_max + 1)
+            yield ns[n_min:], cached_tail_grid(ns, p_values, k_threshold)[:, n_min:]
+        return
+    rows = [cached_tail_row(tail_row_path(p, k_threshold), n_max) for p in p_values]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    streamed = iter_tail_chunks(n_max, p_values[missing], k_threshold, chunk, n_min) if missing else None
+    # Same chunk boundaries as iter_tail_chunks, so streamed blocks line up with the cached slices
+    for start in range(0, n_max + 1, chunk):
+        ns = np.arange(max(start, n_min), min(start + chunk, n_max + 1))
+        if not ns.size:
+            continue
+        H = np.empty((p_values.size, ns.size))
+        if streamed is not None:
+            H[missing] = next(streamed)[1]
+        for i, row in enumerate(rows):
+            if row is not None:
+                H[i] = row[ns]
+        yield ns, H
+
+def write_tail_summary(path, n_max, p_values, k_threshold=THRESHOLD_USERS, n_min=1, chunk=1 << 16, compression=None):
+    """Stream the P(X > k) summary table for N = n_min..n_max to path, one N-chunk at a time.
+
+    The format follows the extension:
+      .csv / .csv.gz   text, optionally gzip-compressed
+      .parquet         columnar, one row group per chunk (compression defaults to zstd)
+      .arrow/.feather  Arrow IPC file, memory-mappable with pyarrow when uncompressed
+      .npy             float64 matrix [N, tails...], memory-mappable with np.load(mmap_mode='r')
+    Parquet and Arrow need pyarrow. Only one chunk is held in memory at a time.
+    Tails come through the on-disk cache (see cached_tail_chunks).
+    Returns the number of rows written.
+    """
+    p_values = [float(p) for p in np.atleast_1d(p_values)]
+    columns = tail_summary_columns(p_values)
+    n_min = max(int(n_min), 0)
+    n_rows = max(int(n_max) - n_min + 1, 0)
+    chunks = cached_tail_chunks(int(n_max), p_values, k_threshold, chunk, n_min)
+    tmp = path + f".{os.getpid()}.tmp"
+    lower = path.lower()
+
+    try:
+        if lower.endswith(".npy"):
+            out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64, shape=(n_rows, len(columns)))
+            row = 0
+            for ns, H in chunks:
+                out[row:row+ns.size, 0] = ns
+                out[row:row+ns.size, 1:] = H.T
+                row += ns.size
+            out.flush()
+            del out
+        elif lower.endswith((".parquet", ".arrow", ".feather")):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as exc:
+                raise ImportError("Parquet/Arrow output needs pyarrow (pip install pyarrow)") from exc
+            schema = pa.schema([pa.field('N', pa.int64())] + [pa.field(c, pa.float64()) for c in columns[1:]])
+            if lower.endswith(".parquet"):
+                writer = pq.ParquetWriter(tmp, schema, compression=compression or 'zstd')
+            else:
+                writer = pa.ipc.new_file(tmp, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+            with writer:
+                for ns, H in chunks:
+                    arrays = [pa.array(ns.astype(np.int64))] + [pa.array(h) for h in H]
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        else:
+            opener = gzip.open if lower.endswith(".gz") or compression == 'gzip' else open
+            with opener(tmp, 'wt', newline='') as f:
+                header = True
+                for ns, H in chunks:
+                    pd.DataFrame(dict(zip(columns, [ns, *H]))).to_csv(f, header=header, index=False)
+                    header = False
+                if header:
+                    f.write(",".join(columns) + "\n")
+        os.replace(tmp, path)
+    except BaseException:
+        # Leave no partial temp file behind (bad format, disk full, missing pyarrow, Ctrl-C)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return n_rows
+
 # ---------- High level analyses ----------
-def compute_tail_for_range(max_n=200, p=DEFAULT_P):
-    """Compute P(X > THRESHOLD_USERS) for n=1..max_n."""
+def compute_tail_for_range(max_n=200, p=DEFAULT_P, link=DEFAULT_LINK):
+    """Compute P(X > link.threshold_users) for n=1..max_n."""
     ns = np.arange(1, max_n+1)
-    tails = np.array([binomial_tail_prob(n, THRESHOLD_USERS, p) for n in ns])
+    tails = cached_tail_grid(ns, [p], link.threshold_users)[0]
     return ns, tails
 
-def varied_p_analysis(max_n=200, p_values=None):
+def varied_p_analysis(max_n=200, p_values=None, link=DEFAULT_LINK):
     """Compute tail probabilities for multiple p values."""
     if p_values is None:
         p_values = [0.01, 0.05, 0.1, 0.2, 0.3]
-    results = {}
-    for p in p_values:
-        ns, tails = compute_tail_for_range(max_n=max_n, p=p)
-        results[p] = (ns, tails)
-    return results
+    ns = np.arange(1, max_n+1)
+    H = cached_tail_grid(ns, p_values, link.threshold_users)
+    return {p: (ns, H[i]) for i, p in enumerate(p_values)}
+
+# ---------- Heterogeneous populations ----------
+def rate_unit(rates):
+    """Largest rate (Mb/s, 1 kb/s resolution) that divides every rate, so demand is an integer count of units."""
+    ints = np.round(np.asarray(rates, dtype=float) * 1000).astype(np.int64)
+    return float(np.gcd.reduce(ints[ints > 0])) / 1000 if np.any(ints > 0) else 1.0
+
+def binomial_support_pmf(n, p, trim=1e-30):
+    """(offset, pmf) of Binomial(n, p) restricted to the range outside which each tail is below trim."""
+    if p <= 0 or n == 0:
+        return 0, np.ones(1)
+    if p >= 1:
+        return int(n), np.ones(1)
+    lo = int(max(binom.ppf(trim, n, p) - 1, 0))
+    hi = int(min(binom.isf(trim, n, p) + 1, n))
+    return lo, binom.pmf(np.arange(lo, hi + 1), n, p)
+
+def poisson_binomial_pmf(probs):
+    """PMF of a sum of independent Bernoulli(p_i) (Poisson-binomial), length len(probs) + 1.
+
+    The Bernoulli PMFs are multiplied as polynomials pairwise in a balanced tree,
+    each level as one batched FFT, for O(n log^2 n) total work.
+    """
+    probs = np.asarray(probs, dtype=float)
+    if probs.size == 0:
+        return np.ones(1)
+    level = np.stack([1 - probs, probs], axis=1)
+    while level.shape[0] > 1:
+        if level.shape[0] % 2:
+            delta = np.zeros((1, level.shape[1]))
+            delta[0, 0] = 1.0
+            level = np.vstack([level, delta])
+        length = 2 * level.shape[1] - 1
+        spectra = np.fft.rfft(level, n=length, axis=1)
+        level = np.fft.irfft(spectra[0::2] * spectra[1::2], n=length, axis=1)
+    return np.clip(level[0, :probs.size + 1], 0.0, 1.0)
+
+def demand_pmf(user_classes=(), rates=None, probs=None, unit=None, trim=1e-30):
+    """Distribution of total offered demand for a heterogeneous population.
+
+    Users come either as UserClass groups (identical users, binomial counts) or
+    as per-user rates and probs arrays, which are grouped by rate into
+    Poisson-binomial counts. Each group's count PMF is spread onto a grid of
+    `unit` Mb/s and the groups are combined with FFT convolutions.
+    Returns (unit, offset, pmf): P(demand = (offset + i) * unit) = pmf[i].
+    """
+    groups = [(c.rate_mbps, binomial_support_pmf(c.count, c.activity, trim)) for c in user_classes]
+    if rates is not None:
+        rates = np.asarray(rates, dtype=float)
+        probs = np.broadcast_to(np.asarray(probs, dtype=float), rates.shape)
+        for rate in np.unique(rates):
+            group = probs[rates == rate]
+            if np.all(group == group[0]):
+                groups.append((rate, binomial_support_pmf(group.size, group[0], trim)))
+            else:
+                groups.append((rate, (0, poisson_binomial_pmf(group))))
+    if unit is None:
+        unit = rate_unit([rate for rate, _ in groups]) if groups else 1.0
+
+    offset, pmf = 0, np.ones(1)
+    for rate, (lo, counts) in groups:
+        step = int(round(rate / unit))
+        spread = np.zeros((counts.size - 1) * step + 1)
+        spread[::step] = counts
+        pmf = np.clip(fftconvolve(pmf, spread), 0.0, None) if pmf.size > 1 and spread.size > 1 else np.convolve(pmf, spread)
+        offset += lo * step
+    return unit, offset, pmf
+
+def multiclass_tail_prob(user_classes=(), link_capacity=LINK_CAPACITY_MBPS, rates=None, probs=None):
+    """P(total demand > link_capacity) for a heterogeneous population (see demand_pmf)."""
+    unit, offset, pmf = demand_pmf(user_classes, rates, probs)
+    first = int(np.floor(link_capacity / unit + 1e-9)) + 1 - offset
+    return float(min(pmf[max(first, 0):].sum(), 1.0))
+
+def mixed_tail_grid(ns, p_values, link=DEFAULT_LINK, chunk=1 << 16):
+    """P(demand > link capacity) when n extra users of link.user_rate_mbps with activity p join
+    the fixed population link.user_classes; shape (len(p_values), len(ns)).
+
+    With no user classes this equals P(X > link.threshold_users) for X ~ Binomial(n, p).
+    Once the extra users alone exceed the capacity the background no longer
+    matters, so only x <= capacity / rate extra users need the background
+    survival and the rest is the binomial tail P(X > x_max). ns is processed in
+    blocks of `chunk`, keeping memory at O(chunk * x_max) however large n is.
+    """
+    ns = np.asarray(ns)
+    p_values = np.atleast_1d(np.asarray(p_values, dtype=float))
+    unit, offset, pmf = demand_pmf(link.user_classes, unit=rate_unit([link.user_rate_mbps] + [c.rate_mbps for c in link.user_classes]))
+    step = int(round(link.user_rate_mbps / unit))
+    capacity_units = int(np.floor(link.link_capacity_mbps / unit + 1e-9))
+    # survival of the background demand: P(B > c) for c = capacity - step * x, which is 1 beyond x_max
+    x_max = (capacity_units - offset) // step
+    x = np.arange(0, max(x_max, -1) + 1)
+    c = capacity_units - step * x - offset
+    tail = np.concatenate([np.cumsum(pmf[::-1])[::-1], [0.0]])
+    background_sf = tail[np.clip(c + 1, 0, pmf.size)]
+    H = np.empty((p_values.size, ns.size))
+    for start in range(0, ns.size, chunk):
+        block = ns[start:start + chunk]
+        for i, p in enumerate(p_values):
+            weights = binom.pmf(x[None, :], block[:, None], p)
+            H[i, start:start + chunk] = np.minimum(weights @ background_sf + binom.sf(x_max, block, p), 1.0)
+    return H
 
 # ---------- Plots & verification ----------
-def plot_tail_vs_n(results_dict, log_y=True, fname=None):
-    """Plot P(X>threshold) vs N for multiple p curves."""
-    plt.figure(figsize=(10,6))
+def new_figure(figsize, show=False):
+    """Figure for a plot: pyplot-managed when it will be shown, otherwise a standalone Agg figure."""
+    if show:
+        return plt.figure(figsize=figsize)
+    return Figure(figsize=figsize)
+
+def finish_figure(fig, fname=None, show=False):
+    """Save fig to fname, optionally show it, and release pyplot's reference."""
+    if fname:
+        fig.savefig(fname, dpi=200)
+    if show:
+        plt.show()
+        plt.close(fig)
+    return fig
+
+def tail_vs_n_figure(results_dict, log_y=True, link=DEFAULT_LINK, show=False):
+    """Figure of P(X>threshold) vs N for multiple p curves."""
+    k = link.threshold_users
+    fig = new_figure((10,6), show)
+    ax = fig.add_subplot()
     for p, (ns, tails) in results_dict.items():
-        plt.plot(ns, tails, label=f"p={p}")
+        ax.plot(ns, tails, label=f"p={p}")
     if log_y:
-        plt.yscale('log')
-        plt.ylabel(f"P(X > {THRESHOLD_USERS}) (log scale)")
+        ax.set_yscale('log')
+        ax.set_ylabel(f"P(X > {k}) (log scale)")
     else:
-        plt.ylabel(f"P(X > {THRESHOLD_USERS})")
-    plt.xlabel("N (number of users)")
-    plt.title(f"P(X > {THRESHOLD_USERS}) vs N for different p")
-    plt.grid(True)
-    plt.legend()
-    if fname:
-        plt.savefig(fname, dpi=200)
-    plt.show()
+        ax.set_ylabel(f"P(X > {k})")
+    ax.set_xlabel("N (number of users)")
+    ax.set_title(f"P(X > {k}) vs N for different p")
+    ax.grid(True)
+    ax.legend()
+    return fig
+
+def pmf_figure(n, p=DEFAULT_P, link=DEFAULT_LINK, show=False):
+    """Figure of the PMF for a given n with the congestion region highlighted.
 
-def plot_pmf_for_n(n, p=DEFAULT_P, fname=None):
-    """Plot PMF for a given n and highlight congestion region."""
+    If link has user classes, n users of link.user_rate_mbps with activity p are
+    added to that population and the total demand PMF is drawn instead.
+    """
+    if link.user_classes:
+        return demand_pmf_figure(link.with_classes(*link.user_classes, UserClass(n, link.user_rate_mbps, p)), show)
+    k = link.threshold_users
     ks = np.arange(0, n+1)
     pmf = binom.pmf(ks, n, p)
-    plt.figure(figsize=(10,5))
-    plt.bar(ks, pmf, color='skyblue', label='P(X=k)')
-    plt.bar(ks[THRESHOLD_USERS+1:], pmf[THRESHOLD_USERS+1:], color='red', label='Congestion (k>10)')
-    plt.axvline(THRESHOLD_USERS, color='k', linestyle='--', label=f"Threshold = {THRESHOLD_USERS}")
-    plt.xlim(0, min(n, THRESHOLD_USERS + 25))
-    plt.xlabel("k = # active users")
-    plt.ylabel("P(X=k)")
-    plt.title(f"Binomial PMF n={n}, p={p:.3f}  --  P(X>{THRESHOLD_USERS}) = {binomial_tail_prob(n, THRESHOLD_USERS, p):.6e}")
-    plt.legend()
-    plt.grid(alpha=0.3)
-    if fname:
-        plt.savefig(fname, dpi=200)
-    plt.show()
+    fig = new_figure((10,5), show)
+    ax = fig.add_subplot()
+    ax.bar(ks, pmf, color='skyblue', label='P(X=k)')
+    ax.bar(ks[k+1:], pmf[k+1:], color='red', label=f'Congestion (k>{k})')
+    ax.axvline(k, color='k', linestyle='--', label=f"Threshold = {k}")
+    ax.set_xlim(0, min(n, k + 25))
+    ax.set_xlabel("k = # active users")
+    ax.set_ylabel("P(X=k)")
+    ax.set_title(f"Binomial PMF n={n}, p={p:.3f}  --  P(X>{k}) = {binomial_tail_prob(n, k, p):.6e}")
+    ax.legend()
+    ax.grid(alpha=0.3)
+    return fig
 
-def plot_heatmap(p_min=0.01, p_max=0.3, p_steps=30, n_max=200, fname=None):
-    """Heatmap of P(X>threshold) for grid of (N,p)."""
+def demand_pmf_figure(link, show=False):
+    """Figure of the total-demand PMF of link.user_classes with demand above the link capacity highlighted."""
+    unit, offset, pmf = demand_pmf(link.user_classes)
+    demand = (offset + np.arange(pmf.size)) * unit
+    over = demand > link.link_capacity_mbps
+    tail = multiclass_tail_prob(link.user_classes, link.link_capacity_mbps)
+    fig = new_figure((10,5), show)
+    ax = fig.add_subplot()
+    ax.bar(demand[~over], pmf[~over], width=unit, color='skyblue', label='P(D=d)')
+    ax.bar(demand[over], pmf[over], width=unit, color='red', label=f'Congestion (d>{link.link_capacity_mbps:g})')
+    ax.axvline(link.link_capacity_mbps, color='k', linestyle='--', label=f"Capacity = {link.link_capacity_mbps:g} Mb/s")
+    upper = demand[min(np.searchsorted(np.cumsum(pmf), 1 - 1e-6), pmf.size - 1)]
+    ax.set_xlim(max(demand[0], 0) - unit, max(link.link_capacity_mbps * 1.2, upper))
+    ax.set_xlabel("d = total demand (Mb/s)")
+    ax.set_ylabel("P(D=d)")
+    classes = ", ".join(f"{c.name + ':' if c.name else ''}{c.count}x{c.rate_mbps:g}Mb/s@{c.activity:g}" for c in link.user_classes)
+    ax.set_title(f"Demand PMF [{classes}]  --  P(D>{link.link_capacity_mbps:g}) = {tail:.6e}", fontsize=9)
+    ax.legend()
+    ax.grid(alpha=0.3)
+    return fig
+
+def heatmap_figure(p_min=0.01, p_max=0.3, p_steps=30, n_max=200, link=DEFAULT_LINK, show=False):
+    """Heatmap figure of P(X>threshold) over a grid of (N,p); returns (fig, p_grid, n_grid, H).
+
+    If link has user classes, N users of link.user_rate_mbps with activity p are
+    added to that population and the cells show P(total demand > capacity).
+    """
+    k = link.threshold_users
     p_grid = np.linspace(p_min, p_max, p_steps)
     n_grid = np.arange(1, n_max+1)
-    H = np.zeros((len(p_grid), len(n_grid)))
-    for i, p in enumerate(p_grid):
-        for j, n in enumerate(n_grid):
-            H[i,j] = binomial_tail_prob(n, THRESHOLD_USERS, p)
-    plt.figure(figsize=(12,5))
-    im = plt.imshow(H, origin='lower', aspect='auto',
-                    extent=[n_grid[0], n_grid[-1], p_grid[0], p_grid[-1]],
-                    cmap='viridis')
-    plt.colorbar(im, label=f"P(X > {THRESHOLD_USERS})")
-    plt.xlabel("N (number of users)")
-    plt.ylabel("p (activity prob)")
-    plt.title(f"Heatmap of P(X>{THRESHOLD_USERS}) over (N,p)")
-    if fname:
-        plt.savefig(fname, dpi=200)
-    plt.show()
+    if link.user_classes:
+        H = mixed_tail_grid(n_grid, p_grid, link)
+        label = f"P(D > {link.link_capacity_mbps:g} Mb/s)"
+    else:
+        H = cached_tail_grid(n_grid, p_grid, k)
+        label = f"P(X > {k})"
+    fig = new_figure((12,5), show)
+    ax = fig.add_subplot()
+    im = ax.imshow(H, origin='lower', aspect='auto',
+                   extent=[n_grid[0], n_grid[-1], p_grid[0], p_grid[-1]],
+                   cmap='viridis')
+    fig.colorbar(im, ax=ax, label=label)
+    ax.set_xlabel("N (number of users)")
+    ax.set_ylabel("p (activity prob)")
+    ax.set_title(f"Heatmap of {label} over (N,p)")
+    return fig, p_grid, n_grid, H
+
+def plot_tail_vs_n(results_dict, log_y=True, fname=None, link=DEFAULT_LINK, show=False):
+    """Plot P(X>threshold) vs N for multiple p curves."""
+    return finish_figure(tail_vs_n_figure(results_dict, log_y, link, show), fname, show)
+
+def plot_pmf_for_n(n, p=DEFAULT_P, fname=None, link=DEFAULT_LINK, show=False):
+    """Plot PMF for a given n and highlight congestion region (see pmf_figure)."""
+    return finish_figure(pmf_figure(n, p, link, show), fname, show)
+
+def plot_demand_pmf(link, fname=None, show=False):
+    """Plot the total-demand PMF of link.user_classes and highlight demand above the link capacity."""
+    return finish_figure(demand_pmf_figure(link, show), fname, show)
+
+def plot_heatmap(p_min=0.01, p_max=0.3, p_steps=30, n_max=200, fname=None, link=DEFAULT_LINK, show=False):
+    """Heatmap of P(X>threshold) for grid of (N,p)."""
+    fig, p_grid, n_grid, H = heatmap_figure(p_min, p_max, p_steps, n_max, link, show)
+    finish_figure(fig, fname, show)
     return p_grid, n_grid, H
 
+# ---------- Batch rendering ----------
+FIGURE_BUILDERS = {
+    'tail_vs_n': tail_vs_n_figure,
+    'pmf': pmf_figure,
+    'demand_pmf': demand_pmf_figure,
+    'heatmap': lambda **kwargs: heatmap_figure(**kwargs)[0],
+}
+
+def render_panel(panel):
+    """Build one report panel (kind, kwargs, png_path, caption), save its PNG and return the pickled figure."""
+    kind, kwargs, png_path, caption = panel
+    fig = FIGURE_BUILDERS[kind](**kwargs)
+    if png_path:
+        fig.savefig(png_path, dpi=200)
+    return pickle.dumps(fig) if caption else None
+
+def render_report(panels, pdf_path, title_lines=(), workers=None):
+    """Render panels in worker processes and assemble the captioned PDF report.
+
+    Each worker builds its figure once and writes the PNG; the same figure is
+    sent back pickled and written as a PDF page with its caption below, then
+    dropped. Panels without a caption only produce a PNG.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool, PdfPages(pdf_path) as pdf:
+        if title_lines:
+            title = Figure(figsize=(11,8.5))
+            title.text(0.5, 0.6, title_lines[0], ha='center', fontsize=22)
+            if len(title_lines) > 1:
+                title.text(0.5, 0.45, "\n".join(title_lines[1:]), ha='center', fontsize=12)
+            pdf.savefig(title)
+        for panel, blob in zip(panels, pool.map(render_panel, panels)):
+            if blob is None:
+                continue
+            fig = pickle.loads(blob)
+            fig.set_size_inches(11, 8.5)
+            fig.subplots_adjust(bottom=0.3)
+            fig.text(0.5, 0.03, panel[3], ha='center', va='bottom', fontsize=10, wrap=True)
+            pdf.savefig(fig)
+            plt.close(fig)
+
 # ---------- Verification and report ----------
-def verify_theoretical_vs_montecarlo(selected_ns=[35,50,100], p=DEFAULT_P, trials=200_000):
+def verify_theoretical_vs_montecarlo(selected_ns=[35,50,100], p=DEFAULT_P, trials=200_000, rel_err=0.02, link=DEFAULT_LINK):
+    """Compare exact, Monte Carlo and normal-approximation tails; trials caps each N."""
+    k = link.threshold_users
     rng = np.random.default_rng(12345)
-    rows = []
-    for n in selected_ns:
-        theo = binomial_tail_prob(n, THRESHOLD_USERS, p)
-        mc = monte_carlo_tail(n, THRESHOLD_USERS, p, trials=trials, rng=rng)
-        approx = normal_approx_tail(n, THRESHOLD_USERS, p)
-        rows.append({'N': n, 'theoretical': theo, 'monte_carlo': mc, 'normal_approx': approx})
-    df = pd.DataFrame(rows).set_index('N')
+    mc = batched_monte_carlo_tail(selected_ns, p, k, rel_err=rel_err,
+                                  batch=min(trials, 20_000), max_trials=trials, rng=rng)
+    df = mc.drop(columns='p').set_index('N')
+    df.insert(0, 'theoretical', [binomial_tail_prob(n, k, p) for n in selected_ns])
+    df['normal_approx'] = [normal_approx_tail(n, k, p) for n in selected_ns]
     return df
 
 # ---------- Main: orchestration ----------
-def main():
+def main(link=DEFAULT_LINK):
     start = time.time()
     print("Starting advanced analysis...")
 
     # 1) compute tails for default p and multiples
     p_values = [0.05, 0.1, 0.2, 0.3, 0.4]
-    results = varied_p_analysis(max_n=200, p_values=p_values)
-
-    # 2) save multi-curve plot (log)
-    plot_tail_vs_n(results, log_y=True, fname=os.path.join(OUTPUT_DIR, "tail_vs_n_log.png"))
+    results = varied_p_analysis(max_n=200, p_values=p_values, link=link)
 
-    # 3) pmfs for chosen Ns
-    for n in [10, 35, 50, 100]:
-        plot_pmf_for_n(n, p=DEFAULT_P, fname=os.path.join(OUTPUT_DIR, f"pmf_n_{n}.png"))
-
-    # 4) heatmap
-    plot_heatmap(fname=os.path.join(OUTPUT_DIR, "heatmap.png"))
-
-    # 5) Monte Carlo verification (selected Ns)
-    df_verify = verify_theoretical_vs_montecarlo([35,50,100], p=DEFAULT_P, trials=200_000)
+    # 2) Monte Carlo verification (selected Ns)
+    df_verify = verify_theoretical_vs_montecarlo([35,50,100], p=DEFAULT_P, trials=200_000, link=link)
     print("\nTheoretical vs Monte Carlo vs Normal-approximation:\n", df_verify)
 
-    # 6) Save summary CSV
+    # 3) Save summary CSV
     summary_csv = os.path.join(OUTPUT_DIR, "tail_summary.csv")
-    all_ns = np.arange(1,201)
-    df_all = pd.DataFrame({
-        'N': all_ns,
-        'P_tail_p=0.01': [binomial_tail_prob(n, THRESHOLD_USERS, p=0.01) for n in all_ns],
-        'P_tail_p=0.05': [binomial_tail_prob(n, THRESHOLD_USERS, p=0.05) for n in all_ns],
-        'P_tail_p=0.1': [binomial_tail_prob(n, THRESHOLD_USERS, p=0.1) for n in all_ns],
-        'P_tail_p=0.2': [binomial_tail_prob(n, THRESHOLD_USERS, p=0.2) for n in all_ns],
-        'P_tail_p=0.3': [binomial_tail_prob(n, THRESHOLD_USERS, p=0.3) for n in all_ns],
-    })
-    df_all.to_csv(summary_csv, index=False)
+    summary_ps = [0.01, 0.05, 0.1, 0.2, 0.3]
+    write_tail_summary(summary_csv, 200, summary_ps, link.threshold_users)
     print(f"Saved table: {summary_csv}")
 
-    # 7) Create a detailed PDF report with captions below images
+    # 4) Render plots in parallel and assemble a detailed PDF report with captions below images
     pdf_path = os.path.join(OUTPUT_DIR, "packet_vs_circuit_report_detailed.pdf")
-    with PdfPages(pdf_path) as pdf:
-        # Title page
-        plt.figure(figsize=(11,8.5)); plt.axis('off')
-        plt.text(0.5, 0.6, "Advanced Analysis: Packet-Switching vs Circuit-Switching", ha='center', fontsize=22)
-        plt.text(0.5, 0.45, f"Threshold users = {THRESHOLD_USERS}, User rate = {USER_RATE_MBPS} Mbps, Link = {LINK_CAPACITY_MBPS} Mbps\nDefault activity probability p = {DEFAULT_P}", ha='center', fontsize=12)
-        pdf.savefig(); plt.close()
-
-        # List of figures with detailed captions
-        figures = [
-            ("tail_vs_n_log.png",
-             "Figura 1: Tail Probability vs N\n"
-             "- Për p=0.01: rrjeti shumë i sigurt, P(X>10) pothuajse 0.\n"
-             "- Për p=0.1: përdorim optimal, PS lejon 3.5 herë më shumë përdorues se CS me rrezik shumë të ulët.\n"
-             "- Për p=0.2/0.3: rrezik i lartë; sistemi mund të mbingarkohet shpejt."),
-            ("pmf_n_35.png",
-             "Figura 2: PMF për N=35, p=0.1\n"
-             "- P(X>10)=0.00042, probabilitet shumë i ulët për mbingarkesë.\n"
-             "- Shiritat blu tregojnë përdorim mesatar (E[X]=3.5).\n"
-             "- PS përdor rrjetin më efikas se CS, duke shmangur kapacitet të humbur."),
-            ("pmf_n_50.png",
-             "Figura 3: PMF për N=50, p=0.1\n"
-             "- Pritshmëria E[X]=5, pjesa blu tregon përdorim mesatar.\n"
-             "- P(X>10)=0.00935, rrezik i pranueshëm, por 22 herë më shumë se për N=35.\n"
-             "- PS ende ofron fitim kapaciteti, por monitorim i rrjetit i nevojshëm për QoS."),
-            ("pmf_n_100.png",
-             "Figura 4: PMF për N=100, p=0.1\n"
-             "- Pritshmëria E[X]=10 përputhet me kapacitetin.\n"
-             "- P(X>10)≈41.7%, rrjeti pothuajse gjysëm i mbingarkuar.\n"
-             "- PS nuk është më optimal, QoS ka dështuar në këtë skenar."),
-            ("heatmap.png",
-             "Figura 5: Heatmap e P(X>10) për N=1..200 dhe p=0.01..0.3\n"
-             "- Zona blu: probabilitet i ulët, rrjeti i sigurt.\n"
-             "- Zona verdhë/purpuri: probabilitet i lartë, rrezik mbingarkese.\n"
-             "- Zona e gjelbër/blu: fitimi i kapacitetit statistikisht i pranueshëm për PS mbi CS.")
-        ]
-
-        # Add each figure with caption below
-        for fname, caption in figures:
-            path = os.path.join(OUTPUT_DIR, fname)
-            if os.path.exists(path):
-                img = plt.imread(path)
-                plt.figure(figsize=(11,8.5))
-                plt.imshow(img)
-                plt.axis('off')
-                plt.text(0.5, -0.08, caption, ha='center', va='top', fontsize=10, wrap=True)
-                pdf.savefig(); plt.close()
+    title = ("Advanced Analysis: Packet-Switching vs Circuit-Switching",
+             f"Threshold users = {link.threshold_users}, User rate = {link.user_rate_mbps} Mbps, Link = {link.link_capacity_mbps} Mbps",
+             f"Default activity probability p = {DEFAULT_P}")
+
+    # List of figures with detailed captions (figures quoted from the link's threshold)
+    k = link.threshold_users
+    tail = {n: binomial_tail_prob(n, k, DEFAULT_P) for n in (35, 50, 100)}
+    capacity_note = "përputhet me kapacitetin" if 100 * DEFAULT_P == k else f"krahasuar me kapacitetin {k}"
+    figures = [
+        ("tail_vs_n_log.png",
+         "Figura 1: Tail Probability vs N\n"
+         f"- Për p=0.01: rrjeti shumë i sigurt, P(X>{k}) pothuajse 0.\n"
+         f"- Për p={DEFAULT_P:g}: përdorim optimal, PS lejon {35 / k:.2g} herë më shumë përdorues se CS me rrezik shumë të ulët.\n"
+         "- Për p=0.2/0.3: rrezik i lartë; sistemi mund të mbingarkohet shpejt."),
+        ("pmf_n_35.png",
+         f"Figura 2: PMF për N=35, p={DEFAULT_P:g}\n"
+         f"- P(X>{k})={tail[35]:.2g}, probabilitet shumë i ulët për mbingarkesë.\n"
+         f"- Shiritat blu tregojnë përdorim mesatar (E[X]={35 * DEFAULT_P:g}).\n"
+         "- PS përdor rrjetin më efikas se CS, duke shmangur kapacitet të humbur."),
+        ("pmf_n_50.png",
+         f"Figura 3: PMF për N=50, p={DEFAULT_P:g}\n"
+         f"- Pritshmëria E[X]={50 * DEFAULT_P:g}, pjesa blu tregon përdorim mesatar.\n"
+         f"- P(X>{k})={tail[50]:.3g}, rrezik i pranueshëm, por {tail[50] / tail[35]:.0f} herë më shumë se për N=35.\n"
+         "- PS ende ofron fitim kapaciteti, por monitorim i rrjetit i nevojshëm për QoS."),
+        ("pmf_n_100.png",
+         f"Figura 4: PMF për N=100, p={DEFAULT_P:g}\n"
+         f"- Pritshmëria E[X]={100 * DEFAULT_P:g} {capacity_note}.\n"
+         f"- P(X>{k})≈{tail[100] * 100:.1f}%, rrjeti pothuajse gjysëm i mbingarkuar.\n"
+         "- PS nuk është më optimal, QoS ka dështuar në këtë skenar."),
+        ("heatmap.png",
+         f"Figura 5: Heatmap e P(X>{k}) për N=1..200 dhe p=0.01..0.3\n"
+         "- Zona blu: probabilitet i ulët, rrjeti i sigurt.\n"
+         "- Zona verdhë/purpuri: probabilitet i lartë, rrezik mbingarkese.\n"
+         "- Zona e gjelbër/blu: fitimi i kapacitetit statistikisht i pranueshëm për PS mbi CS.")
+    ]
 
+    captions = dict(figures)
+    panels = [('tail_vs_n', dict(results_dict=results, log_y=True, link=link), "tail_vs_n_log.png")]
+    panels += [('pmf', dict(n=n, p=DEFAULT_P, link=link), f"pmf_n_{n}.png") for n in [10, 35, 50, 100]]
+    panels += [('heatmap', dict(link=link), "heatmap.png")]
+    render_report([(kind, kwargs, os.path.join(OUTPUT_DIR, fname), captions.get(fname)) for kind, kwargs, fname in panels],
+                  pdf_path, title)
     print(f"Saved detailed PDF report with captions below images: {pdf_path}")
 
     end = time.time()
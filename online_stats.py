@@ -0,0 +1,171 @@
+import numpy as np
+
+# ---------- Ring buffer ----------
+class RingBuffer:
+    """The last `size` pushed values (scalars or rows of `width` values) with a running sum.
+
+    The sum is recomputed from the buffer every time it wraps, so floating
+    point drift cannot accumulate over long runs.
+    """
+
+    def __init__(self, size, width=None):
+        shape = (size,) if width is None else (size, width)
+        self.values = np.zeros(shape)
+        self.size = size
+        self.pos = 0
+        self.filled = 0
+        self.total = np.zeros(shape[1:]) if width is not None else 0.0
+
+    def __len__(self):
+        return self.filled
+
+    def push(self, value):
+        self.total = self.total + value - self.values[self.pos]
+        self.values[self.pos] = value
+        self.pos += 1
+        if self.pos == self.size:
+            self.pos = 0
+            self.total = self.values.sum(axis=0)
+        if self.filled < self.size:
+            self.filled += 1
+
+    def sum(self):
+        return self.total
+
+    def mean(self):
+        return self.total / self.filled if self.filled else self.total * np.nan
+
+    def ordered(self):
+        """Contents oldest first."""
+        if self.filled < self.size:
+            return self.values[:self.filled]
+        return np.concatenate([self.values[self.pos:], self.values[:self.pos]])
+
+# ---------- Downsampled history ----------
+class DownsampledHistory:
+    """At most `points` rows summarising the whole run, whatever its length.
+
+    Each row is the mean of `stride` consecutive updates; when the buffer is
+    full, neighbouring rows are averaged in pairs and the stride doubles, so
+    the history always spans the run at a resolution of about steps / points.
+    """
+
+    def __init__(self, points=512, width=1):
+        self.points = points - points % 2
+        self.rows = np.zeros((self.points, width))
+        self.starts = np.zeros(self.points, dtype=np.int64)
+        self.length = 0
+        self.stride = 1
+        self.acc = np.zeros(width)
+        self.acc_count = 0
+        self.step = 0
+
+    def __len__(self):
+        return self.length
+
+    def push(self, values):
+        self.acc += values
+        self.acc_count += 1
+        self.step += 1
+        if self.acc_count < self.stride:
+            return
+        if self.length == self.points:
+            half = self.points // 2
+            self.rows[:half] = (self.rows[0::2] + self.rows[1::2]) / 2
+            self.starts[:half] = self.starts[0::2]
+            self.length = half
+            self.stride *= 2
+            if self.acc_count < self.stride:
+                return
+        self.rows[self.length] = self.acc / self.acc_count
+        self.starts[self.length] = self.step - self.acc_count
+        self.length += 1
+        self.acc[:] = 0
+        self.acc_count = 0
+
+    def series(self):
+        """(first step of each row, row means) for the completed rows."""
+        return self.starts[:self.length].copy(), self.rows[:self.length].copy()
+
+# ---------- Streaming metrics ----------
+class StreamingMetrics:
+    """Constant-memory statistics for a fixed set of per-step metrics, updated together.
+
+    Every update feeds all metrics at once (NumPy vectors, one entry per
+    metric) into Welford running mean/variance plus min/max, an exponentially
+    weighted average with the given half-life (in updates), a sliding window
+    of the last `window` updates and, if history_points is set, a
+    DownsampledHistory. Subscribers registered with subscribe() receive
+    (step, {name: value}) every `every` updates for live monitoring.
+    """
+
+    def __init__(self, names, window=20, halflife=20, history_points=512):
+        self.names = tuple(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        k = len(self.names)
+        self.count = 0
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        self.last = np.zeros(k)
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.ewma = np.zeros(k)
+        self.window = RingBuffer(window, k)
+        self.history = DownsampledHistory(history_points, k) if history_points else None
+        self.subscribers = []
+
+    def update(self, values):
+        """Add one value per metric, in the order of names."""
+        x = np.asarray(values, dtype=float)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        np.minimum(self.min, x, out=self.min)
+        np.maximum(self.max, x, out=self.max)
+        # Start the average at the first value instead of decaying up from 0
+        self.ewma = x.copy() if self.count == 1 else self.ewma + self.alpha * (x - self.ewma)
+        self.last = x
+        self.window.push(x)
+        if self.history is not None:
+            self.history.push(x)
+        for callback, every in self.subscribers:
+            if self.count % every == 0:
+                callback(self.count, dict(zip(self.names, x.tolist())))
+
+    def subscribe(self, callback, every=1):
+        """Call callback(step, {name: value}) every `every` updates; returns a handle for unsubscribe()."""
+        handle = (callback, every)
+        self.subscribers.append(handle)
+        return handle
+
+    def unsubscribe(self, handle):
+        self.subscribers.remove(handle)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
+
+    def __getitem__(self, name):
+        """Statistics of one metric as a dict."""
+        i = self.index[name]
+        return {
+            'count': self.count,
+            'last': float(self.last[i]),
+            'mean': float(self.mean[i]),
+            'std': float(np.sqrt(self.variance()[i])),
+            'min': float(self.min[i]),
+            'max': float(self.max[i]),
+            'ewma': float(self.ewma[i]),
+            'window_mean': float(self.window.mean()[i]) if len(self.window) else np.nan,
+        }
+
+    def summary(self):
+        return {name: self[name] for name in self.names}
+
+    def history_frame(self):
+        """Downsampled history as {'step': ..., name: ...} arrays (empty without history_points)."""
+        if self.history is None:
+            return {'step': np.empty(0, dtype=np.int64), **{name: np.empty(0) for name in self.names}}
+        steps, rows = self.history.series()
+        return {'step': steps, **{name: rows[:, i] for i, name in enumerate(self.names)}}
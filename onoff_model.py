@@ -0,0 +1,193 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.stats import binom
+
+from link_config import DEFAULT_LINK
+
+# ---------- Markov on/off users ----------
+def transition_probs(p, mean_on, dt=0.05):
+    """Per-step probabilities (on -> off, off -> on) giving stationary activity p and mean on time mean_on (s).
+
+    mean_on = dt / (1 - p) makes the two rows identical, i.e. the i.i.d.
+    Bernoulli(p) redraw of the default user model. p = 0 never switches on;
+    p = 1 is always on (leave 0, join 1) whatever mean_on is.
+    """
+    p = np.asarray(p, dtype=float)
+    if np.any((p < 0) | (p > 1)):
+        raise ValueError(f"activity p must be in [0, 1], got {p}")
+    always_on = p == 1
+    leave_on = np.where(always_on, 0.0, dt / mean_on)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        join_on = np.where(always_on, 1.0, leave_on * p / (1 - p))
+    if np.any(leave_on > 1) or np.any(join_on > 1):
+        raise ValueError(f"mean_on={mean_on} s is too short for dt={dt} s and activity p; "
+                         f"need mean_on >= dt * max(1, p / (1 - p))")
+    if p.ndim == 0:
+        return float(leave_on), float(join_on)
+    return leave_on, join_on
+
+class MarkovOnOff:
+    """Two-state Markov chain per user, stepped for all users with one vector draw.
+
+    p may be a scalar or one activity per user. Users start in the
+    stationary distribution, so every step's marginal activity is
+    Bernoulli(p) as in the i.i.d. model; only the time correlation differs.
+    """
+
+    def __init__(self, p, mean_on, dt=0.05):
+        self.p = p
+        self.mean_on = mean_on
+        self.dt = dt
+        self.leave_on, self.join_on = transition_probs(p, mean_on, dt)
+
+    def initial(self, rng, n):
+        return rng.random(n) < self.p
+
+    def step(self, rng, active):
+        u = rng.random(active.size)
+        return np.where(active, u >= self.leave_on, u < self.join_on)
+
+# ---------- Overload periods ----------
+def overload_statistics(N, k, p, mean_on, dt=0.05):
+    """Stationary overload probability and the mean length of overload periods (more than k users active).
+
+    Every user is on with probability p at any step, so the stationary
+    overload probability equals the binomial tail P(X > k) whatever mean_on
+    is. Overload periods differ: with X' = Bin(X, 1 - a) + Bin(N - X, b) the
+    next step's count, the per-step rate of entering overload is
+    sum_{i<=k} P(X = i) P(X' > k | X = i), and the mean period is
+    P(X > k) / that rate steps (exact for the slotted simulator).
+    """
+    leave_on, join_on = transition_probs(p, mean_on, dt)
+    prob = float(binom.sf(k, N, p))
+    i = np.arange(min(k, N) + 1)[:, None]          # active now (not overloaded)
+    j = np.arange(min(k, N) + 1)[None, :]          # of those, still active next step
+    stay = binom.pmf(j, i, 1 - leave_on)
+    # Overload next step needs more than k - j of the N - i idle users to switch on
+    enter = (stay * binom.sf(k - j, N - i, join_on)).sum(axis=1)
+    upcross = float((binom.pmf(i[:, 0], N, p) * enter).sum())
+    iid_upcross = (1 - prob) * prob
+    return {
+        'prob_overload': prob,
+        'overloads_per_s': upcross / dt,
+        'mean_overload_s': prob / upcross * dt if upcross > 0 else np.inf,
+        'iid_mean_overload_s': prob / iid_upcross * dt if iid_upcross > 0 else np.inf,
+    }
+
+# ---------- Fluid queue (Anick-Mitra-Sondhi) ----------
+def fluid_modes(N, p, mean_on, peak_mbps, capacity_mbps):
+    """Spectral modes of the on/off fluid queue.
+
+    With F_i(x) = P(queue <= x, i sources on), F' D = F Q where Q is the
+    birth-death generator of the number of sources on and D the drift
+    i * peak - capacity, so F is a sum of modes phi_j exp(z_j x) with
+    phi Q D^-1 = z phi. States with zero drift carry no boundary condition
+    and are eliminated first (Schur complement of Q). Q is reversible, so
+    with s = sqrt(P(i on)) the problem is solved for the well-scaled
+    symmetric s Q s^-1 and phi_ji = s_i u_ji. Returns the kept states, their
+    drifts, eigenvalues z, scaled modes u and s.
+    """
+    alpha = 1 / mean_on
+    beta = alpha * p / (1 - p)
+    states = np.arange(N + 1)
+    Q = np.diag(-(N - states) * beta - states * alpha)
+    Q += np.diag((N - states[:-1]) * beta, 1) + np.diag(states[1:] * alpha, -1)
+    drift = states * peak_mbps - capacity_mbps
+    S = np.flatnonzero(drift != 0)
+    Z = np.flatnonzero(drift == 0)
+    Qs = Q[np.ix_(S, S)]
+    if Z.size:
+        Qs = Qs - Q[np.ix_(S, Z)] @ np.linalg.solve(Q[np.ix_(Z, Z)], Q[np.ix_(Z, S)])
+    d = drift[S]
+    log_s = 0.5 * binom.logpmf(S, N, p)
+    with np.errstate(over='ignore', invalid='ignore'):
+        M = np.where(Qs != 0, Qs * np.exp(log_s[:, None] - log_s[None, :]), 0.0)
+    M = (M + M.T) / 2
+    # phi Q D^-1 = z phi  <=>  D^-1 M u = z u  with phi = s * u
+    z, u = np.linalg.eig(M / d[:, None])
+    return S, d, z.real, u.real.T, np.exp(log_s)
+
+def fluid_queue(N, p, mean_on, peak_mbps=DEFAULT_LINK.user_rate_mbps, capacity_mbps=DEFAULT_LINK.link_capacity_mbps,
+                buffer_mbit=0.4):
+    """Overflow of a finite fluid buffer fed by N exponential on/off sources (Anick-Mitra-Sondhi).
+
+    Sources are on for mean_on seconds on average and on a fraction p of the
+    time, sending peak_mbps while on; the link drains capacity_mbps. The
+    modes are fitted to F_i(0) = 0 for overloaded states and F_i(B-) = P(i on)
+    for draining ones; probability left at B in overloaded states overflows.
+    Returns the fraction of offered traffic lost, the lost rate and
+    P(buffer full).
+    """
+    offered = N * p * peak_mbps
+    S, d, z, u, s = fluid_modes(N, p, mean_on, peak_mbps, capacity_mbps)
+    up = d > 0
+    # Decaying modes are anchored at 0 and growing ones at B, so no exponential overflows.
+    # Boundary conditions are divided by s_i: sum_j a_j u_ji = 0 at 0 (overloaded), = s_i at B- (draining)
+    at0 = np.where(z <= 0, 1.0, np.exp(-np.abs(z) * buffer_mbit))
+    atB = np.where(z <= 0, np.exp(-np.abs(z) * buffer_mbit), 1.0)
+    A = np.vstack([(u * at0[:, None])[:, up].T, (u * atB[:, None])[:, ~up].T])
+    rhs = np.concatenate([np.zeros(up.sum()), s[~up]])
+    a = np.linalg.lstsq(A, rhs, rcond=None)[0]
+    full = np.clip(s * (s - (a * atB) @ u), 0, None)
+    lost = float((d[up] * full[up]).sum())
+    return {
+        'loss_rate': lost / offered if offered else 0.0,
+        'lost_mbps': lost,
+        'prob_full': float(full.sum()),
+    }
+
+def queue_tail(N, p, mean_on, x, peak_mbps=DEFAULT_LINK.user_rate_mbps, capacity_mbps=DEFAULT_LINK.link_capacity_mbps):
+    """P(queue > x) for an infinite fluid buffer, the classic AMS overflow probability; x may be an array (Mbit)."""
+    if N * p * peak_mbps >= capacity_mbps:
+        return np.ones_like(np.asarray(x, dtype=float))
+    S, d, z, u, s = fluid_modes(N, p, mean_on, peak_mbps, capacity_mbps)
+    up = d > 0
+    # F(x) = pi + sum over decaying modes; one decaying mode per overloaded state, fitted to F_i(0) = 0
+    neg = np.argsort(z)[:up.sum()]
+    a = np.linalg.lstsq(u[neg][:, up].T, -s[up], rcond=None)[0]
+    x = np.asarray(x, dtype=float)
+    # P(Q > x) = 1 - sum_i F_i(x) = -sum_j a_j exp(z_j x) sum_i s_i u_ji
+    return -(np.exp(np.multiply.outer(x, z[neg])) * (a * (u[neg] @ s))).sum(axis=-1)
+
+def bufferless_loss(N, p, peak_mbps=DEFAULT_LINK.user_rate_mbps, capacity_mbps=DEFAULT_LINK.link_capacity_mbps):
+    """Fraction of offered traffic above capacity with no buffer, E[(X r - c)+] / E[X r]."""
+    states = np.arange(N + 1)
+    excess = np.clip(states * peak_mbps - capacity_mbps, 0, None)
+    return float((binom.pmf(states, N, p) * excess).sum() / (N * p * peak_mbps))
+
+# ---------- Comparison ----------
+def compare_with_binomial(ns, p=0.1, mean_on=1.0, link=DEFAULT_LINK, buffer_mbit=0.4, dt=0.05):
+    """Table of the binomial (i.i.d.) numbers next to the Markov on/off ones for each N."""
+    k = link.threshold_users
+    rows = []
+    for n in ns:
+        stats = overload_statistics(n, k, p, mean_on, dt)
+        fluid = fluid_queue(n, p, mean_on, link.user_rate_mbps, link.link_capacity_mbps, buffer_mbit)
+        iid = fluid_queue(n, p, dt / (1 - p), link.user_rate_mbps, link.link_capacity_mbps, buffer_mbit)
+        rows.append({
+            'N': n,
+            'P(X>k)': stats['prob_overload'],
+            'iid_mean_overload_s': stats['iid_mean_overload_s'],
+            'onoff_mean_overload_s': stats['mean_overload_s'],
+            'onoff_overloads_per_s': stats['overloads_per_s'],
+            'bufferless_loss': bufferless_loss(n, p, link.user_rate_mbps, link.link_capacity_mbps),
+            'iid_fluid_loss': iid['loss_rate'],
+            'onoff_fluid_loss': fluid['loss_rate'],
+        })
+    return pd.DataFrame(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Binomial vs Markov on/off overload and buffer-overflow figures.")
+    parser.add_argument('--n', type=int, nargs='+', default=[35, 50, 75, 100])
+    parser.add_argument('--p', type=float, default=0.1)
+    parser.add_argument('--mean-on', type=float, default=1.0, help="mean session length in seconds")
+    parser.add_argument('--buffer-mbit', type=float, default=0.4)
+    args = parser.parse_args(argv)
+    df = compare_with_binomial(args.n, args.p, args.mean_on, buffer_mbit=args.buffer_mbit)
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+    return df
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,560 @@
+import numpy as np
+from scipy.stats import binom
+import heapq
+from collections import deque
+
+from link_config import DEFAULT_LINK
+from delay_sketch import DelaySketch
+from online_stats import RingBuffer, StreamingMetrics
+
+# Packet status codes stored in PacketTable.status
+FREE, TRANSMITTING, BUFFERED, PROCESSING = range(4)
+
+# Per-step values fed to PacketSwitchCore.metrics, in this order
+METRIC_NAMES = ('active_users', 'throughput', 'utilization', 'loss_rate', 'buffer_occupancy', 'packets')
+
+class PacketTable:
+    """Struct-of-arrays store for in-flight packets.
+
+    Each packet is a row in preallocated NumPy columns; rows of delivered or
+    dropped packets return to a free list and are reused, and the columns double
+    in size when full. The free list is a NumPy stack with a top index, so
+    packets are added and released in slices. Status is an integer code (FREE, TRANSMITTING, BUFFERED,
+    PROCESSING) so per-step updates are masked vector operations.
+    """
+
+    def __init__(self, capacity=1024):
+        self.high = 0
+        self.live = 0
+        self.next_id = 0
+        self.free_top = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        old = getattr(self, 'status', None)
+        columns = {
+            'status': np.int8, 'user_id': np.int32, 'packet_id': np.int64, 'size': np.int32,
+            'creation_time': np.float64, 'start_transmission_time': np.float64, 'enqueue_time': np.float64,
+            'bits_transmitted': np.float64, 'transmission_progress': np.float64, 'position_x': np.float64,
+        }
+        for name, dtype in columns.items():
+            column = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                column[:self.high] = getattr(self, name)[:self.high]
+            setattr(self, name, column)
+        free = np.empty(capacity, dtype=np.int64)
+        if old is not None:
+            free[:self.free_top] = self.free[:self.free_top]
+        self.free = free
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.live
+
+    def add(self, user_ids, creation_time, sizes):
+        """Insert packets in the TRANSMITTING state and return their row indices."""
+        user_ids = np.atleast_1d(user_ids)
+        count = user_ids.size
+        reused = min(count, self.free_top)
+        rows = np.empty(count, dtype=np.int64)
+        # Most recently freed rows first, as a stack
+        rows[:reused] = self.free[self.free_top - reused:self.free_top][::-1]
+        self.free_top -= reused
+        fresh = count - reused
+        if self.high + fresh > self.capacity:
+            self.allocate(max(2 * self.capacity, self.high + fresh))
+        rows[reused:] = np.arange(self.high, self.high + fresh)
+        self.high += fresh
+
+        self.status[rows] = TRANSMITTING
+        self.user_id[rows] = user_ids
+        self.packet_id[rows] = np.arange(self.next_id, self.next_id + count)
+        self.size[rows] = sizes
+        self.creation_time[rows] = creation_time
+        self.start_transmission_time[rows] = np.nan
+        self.enqueue_time[rows] = np.nan
+        self.bits_transmitted[rows] = 0
+        self.transmission_progress[rows] = 0
+        self.position_x[rows] = 0
+        self.next_id += count
+        self.live += count
+        return rows
+
+    def release(self, rows):
+        """Free the given rows (delivered or dropped packets)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        self.status[rows] = FREE
+        self.free[self.free_top:self.free_top + rows.size] = rows
+        self.free_top += rows.size
+        self.live -= rows.size
+
+    def rows(self, status):
+        """Row indices currently in `status`, in creation order."""
+        rows = np.flatnonzero(self.status[:self.high] == status)
+        return rows[np.argsort(self.packet_id[rows], kind='stable')]
+
+    def count(self, status):
+        return int(np.count_nonzero(self.status[:self.high] == status))
+
+def theoretical_probabilities(n, p, link=DEFAULT_LINK):
+    """Binomial overload figures for n users with activity p, or for link.user_classes when set.
+
+    With user classes there is no single "users supported" count, so
+    threshold and max_supported_users are None and both probabilities are
+    P(total demand > link capacity) from the exact multiclass distribution.
+    """
+    if link.user_classes:
+        from network_analysis import multiclass_tail_prob
+        prob_overload = multiclass_tail_prob(link.user_classes, link.link_capacity_mbps)
+        return {
+            'n': link.total_users,
+            'p': p,
+            'threshold': None,
+            'prob_over_threshold': prob_overload,
+            'expected_active': sum(c.count * c.activity for c in link.user_classes),
+            'max_supported_users': None,
+            'prob_overload': prob_overload
+        }
+    threshold = link.threshold_users
+    max_supported_users = link.link_capacity_bps / link.user_rate_bps
+    return {
+        'n': n,
+        'p': p,
+        'threshold': threshold,
+        'prob_over_threshold': binom.sf(threshold, n, p),
+        'expected_active': n * p,
+        'max_supported_users': max_supported_users,
+        'prob_overload': binom.sf(max_supported_users, n, p)
+    }
+
+class PacketSwitchCore:
+    """Headless packet switch simulation: users, packets and statistics, no plotting."""
+
+    def __init__(self, N_users, user_active_prob=0.1, seed=None, max_buffer_size=50, processing_capacity=8,
+                 link=DEFAULT_LINK, mean_on_time=None, dt=0.05, history_points=None):
+        # A link with user classes defines the population itself; N_users and user_active_prob are then ignored
+        if link.user_classes:
+            counts = [c.count for c in link.user_classes]
+            N_users = sum(counts)
+            self.user_rates = np.repeat([c.rate_mbps * 1e6 for c in link.user_classes], counts)
+            self.user_probs = np.repeat([c.activity for c in link.user_classes], counts)
+            user_active_prob = float(self.user_probs.mean()) if N_users else 0.0
+        else:
+            self.user_rates = np.full(N_users, link.user_rate_bps)
+            self.user_probs = user_active_prob
+        self.N_users = N_users
+        self.user_active_prob = user_active_prob
+        self.link = link
+        self.link_capacity = link.link_capacity_bps  # 1 Gb/s by default
+        self.user_capacity = link.user_rate_bps  # 100 Mb/s by default
+        # Keep the seed (drawing fresh entropy if none was given) so a run can be recorded and replayed
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.rng = np.random.default_rng(self.seed)
+
+        # Network state, one entry per user
+        self.user_active = np.zeros(N_users, dtype=bool)
+        self.packets_sent = np.zeros(N_users, dtype=np.int64)
+        self.packets = PacketTable()
+        self.buffer = deque()  # row indices into self.packets, FIFO order
+        self.max_buffer_size = max_buffer_size
+        self.processing_capacity = processing_capacity  # packets per time step
+        self.processed_packets = 0
+        self.dropped_packets = 0
+        self.bytes_processed = 0
+        self.time = 0
+        self.dt = dt
+
+        # Activity model: None redraws every user independently each step; a mean session length (seconds)
+        # switches to Markov on/off users with the same stationary activity, started in equilibrium
+        self.mean_on_time = mean_on_time
+        self.onoff = None
+        if mean_on_time is not None:
+            from onoff_model import MarkovOnOff
+            self.onoff = MarkovOnOff(self.user_probs, mean_on_time, self.dt)
+            self.user_active = self.onoff.initial(self.rng, N_users)
+
+        # Statistics: current values, plus constant-memory running statistics of them in self.metrics
+        # (per-step history is kept by start_recording or returned by run; history_points adds a
+        # downsampled history of at most that many rows, off by default)
+        self.throughput_window = RingBuffer(max(1, int(round(1.0 / self.dt))))  # bytes delivered, last second
+        self.metrics = StreamingMetrics(METRIC_NAMES, window=self.throughput_window.size,
+                                        history_points=history_points)
+        self.current_throughput = 0
+        self.current_utilization = 0
+        self.current_loss_rate = 0
+        self.current_active_users = 0
+        self.current_buffer_occupancy = 0
+
+        # Per-packet delays (seconds) in fixed-memory sketches: creation to delivery, and time spent in the buffer
+        self.end_to_end_delay = DelaySketch()
+        self.queueing_delay = DelaySketch()
+
+        self.profiler = None  # see enable_profiling
+        self.recorder = None  # see start_recording
+        self.theoretical_stats = self.calculate_theoretical_probabilities()
+
+    def calculate_theoretical_probabilities(self):
+        return theoretical_probabilities(self.N_users, self.user_active_prob, self.link)
+
+    def update_users(self):
+        """Draw this step's activity for all users and create their packets in bulk."""
+        if self.onoff is None:
+            self.user_active = self.rng.random(self.N_users) < self.user_probs
+        else:
+            self.user_active = self.onoff.step(self.rng, self.user_active)
+        # Generate packets with higher probability during activity
+        sending = np.flatnonzero(self.user_active & (self.rng.random(self.N_users) < 0.7))  # Increased to see more action
+        if sending.size:
+            sizes = self.rng.integers(500, 1501, size=sending.size)  # bytes
+            self.packets.add(sending, self.time, sizes)
+            self.packets_sent[sending] += 1
+        return int(np.count_nonzero(self.user_active))
+
+    def update_packets(self, active_count):
+        # Calculate available bandwidth: active users share the link in proportion to their rates
+        total_demand = float(self.user_rates[self.user_active].sum()) if active_count > 0 else 0.0
+        if total_demand > self.link_capacity:
+            bandwidth_scale = self.link_capacity / total_demand
+        else:
+            bandwidth_scale = 1.0 if total_demand > 0 else 0.0
+
+        table = self.packets
+        high = table.high
+        status = table.status[:high]
+        transmitting = np.flatnonzero(status == TRANSMITTING)
+        processing = np.flatnonzero(status == PROCESSING)
+
+        # Transmission progress for every transmitting packet at once
+        if transmitting.size:
+            start = table.start_transmission_time[transmitting]
+            table.start_transmission_time[transmitting] = np.where(np.isnan(start), table.creation_time[transmitting], start)
+            bits_total = table.size[transmitting] * 8.0
+            bandwidth = self.user_rates[table.user_id[transmitting]] * bandwidth_scale
+            bits = table.bits_transmitted[transmitting] + bandwidth * self.dt
+            complete = bits >= bits_total
+            bits = np.minimum(bits, bits_total)
+            table.bits_transmitted[transmitting] = bits
+            table.transmission_progress[transmitting] = np.where(complete, 1.0, bits / bits_total)
+
+            # Completed packets join the buffer in creation order until it is full
+            finished = transmitting[complete]
+            finished = finished[np.argsort(table.packet_id[finished], kind='stable')]
+            space = max(0, self.max_buffer_size - len(self.buffer))
+            buffered, dropped = finished[:space], finished[space:]
+            table.status[buffered] = BUFFERED
+            table.enqueue_time[buffered] = self.time
+            self.buffer.extend(buffered.tolist())
+            if dropped.size:
+                table.release(dropped)
+                self.dropped_packets += int(dropped.size)
+
+        # Move processing packets toward the destination
+        current_throughput_bytes = 0
+        if processing.size:
+            table.position_x[processing] += 3.0 * self.dt
+            delivered = processing[table.position_x[processing] > 9.0]
+            if delivered.size:
+                current_throughput_bytes = int(table.size[delivered].sum())
+                self.end_to_end_delay.add(self.time - table.creation_time[delivered])
+                self.processed_packets += int(delivered.size)
+                table.release(delivered)
+
+        # Update throughput
+        self.throughput_window.push(current_throughput_bytes)
+        self.bytes_processed += current_throughput_bytes
+
+        # Process packets from buffer
+        served = [self.buffer.popleft() for _ in range(min(self.processing_capacity, len(self.buffer)))]
+        if served:
+            table.status[served] = PROCESSING
+            table.position_x[served] = 7.6  # Start processing position
+            self.queueing_delay.add(self.time - table.enqueue_time[served])
+
+    def update_statistics(self, active_count):
+        self.current_active_users = active_count
+
+        # Throughput and utilization over a sliding window of the last second
+        window = self.throughput_window
+        self.current_throughput = window.sum() * 8 / (len(window) * self.dt) / 1e6 if len(window) else 0.0
+        self.current_utilization = min(100, self.current_throughput / (self.link_capacity / 1e6) * 100)
+
+        # Calculate loss rate
+        total_packets = self.processed_packets + self.dropped_packets
+        self.current_loss_rate = (self.dropped_packets / total_packets * 100) if total_packets > 0 else 0
+
+        # Buffer occupancy
+        self.current_buffer_occupancy = (len(self.buffer) / self.max_buffer_size) * 100
+
+        self.metrics.update((active_count, self.current_throughput, self.current_utilization, self.current_loss_rate,
+                             self.current_buffer_occupancy, len(self.packets)))
+
+    def subscribe(self, callback, every=1):
+        """Call callback(step, {metric: value}) every `every` steps (see METRIC_NAMES); returns a handle."""
+        return self.metrics.subscribe(callback, every)
+
+    def delay_percentiles(self, qs=(0.5, 0.99, 0.999)):
+        """End-to-end and queueing delay quantiles in seconds, e.g. {'end_to_end': {'p50': ..., 'p99': ...}, ...}."""
+        return {'end_to_end': self.end_to_end_delay.percentiles(qs), 'queueing': self.queueing_delay.percentiles(qs)}
+
+    def enable_profiling(self, profiler=None, **kwargs):
+        """Time every step phase with a profiling.Profiler (created from kwargs if not given) and return it."""
+        from profiling import Profiler
+        self.profiler = profiler if profiler is not None else Profiler(**kwargs)
+        return self.profiler
+
+    def start_recording(self, record_users=False):
+        """Record a sim_trace.TraceRecorder row for every following step and return the recorder."""
+        from sim_trace import TraceRecorder
+        self.recorder = TraceRecorder(self, record_users=record_users)
+        return self.recorder
+
+    def step(self):
+        """Advance the simulation by one dt; returns the number of active users."""
+        self.time += self.dt
+        if self.profiler is not None:
+            active_count = self.profiled_step(self.profiler)
+        else:
+            active_count = self.update_users()
+            self.update_packets(active_count)
+            self.update_statistics(active_count)
+        if self.recorder is not None:
+            self.recorder.record(self, active_count)
+        return active_count
+
+    def profiled_step(self, profiler):
+        """step() with each phase timed and the packet count and buffer depth recorded."""
+        profiler.begin_step()
+        with profiler.phase('users'):
+            active_count = self.update_users()
+        with profiler.phase('packets'):
+            self.update_packets(active_count)
+        with profiler.phase('statistics'):
+            self.update_statistics(active_count)
+        profiler.observe('active_users', active_count)
+        profiler.observe('packets', len(self.packets))
+        profiler.observe('buffer_depth', len(self.buffer))
+        return active_count
+
+    def run(self, steps, history=True):
+        """Run `steps` steps headlessly and return the per-step statistics as arrays.
+
+        With history=False nothing per step is kept (memory stays constant for
+        any run length) and the running statistics self.metrics.summary() are
+        returned instead.
+        """
+        if not history:
+            for _ in range(steps):
+                self.step()
+            return self.metrics.summary()
+        history = {
+            'time': np.empty(steps),
+            'active_users': np.empty(steps, dtype=np.int64),
+            'throughput': np.empty(steps),
+            'utilization': np.empty(steps),
+            'loss_rate': np.empty(steps),
+            'buffer_occupancy': np.empty(steps),
+            'processed_packets': np.empty(steps, dtype=np.int64),
+            'dropped_packets': np.empty(steps, dtype=np.int64),
+        }
+        for i in range(steps):
+            history['active_users'][i] = self.step()
+            history['time'][i] = self.time
+            history['throughput'][i] = self.current_throughput
+            history['utilization'][i] = self.current_utilization
+            history['loss_rate'][i] = self.current_loss_rate
+            history['buffer_occupancy'][i] = self.current_buffer_occupancy
+            history['processed_packets'][i] = self.processed_packets
+            history['dropped_packets'][i] = self.dropped_packets
+        return history
+
+# ---------- Discrete-event engine ----------
+USER_ON, USER_OFF, PACKET_ARRIVAL, TX_COMPLETE, DEQUEUE, DELIVERY = range(6)
+EVENT_NAMES = ("user_on", "user_off", "packet_arrival", "tx_complete", "dequeue", "delivery")
+
+class EventDrivenPacketSwitch:
+    """Event-driven packet switch on a heap-based event queue, a related model to PacketSwitchCore.
+
+    User activity follows the slotted model of the fixed-step simulator (each
+    user is active in a slot of length dt with probability p, and sends a
+    packet in an active slot with probability packet_prob), with on/off runs
+    and packet slots drawn as geometric gaps. Everything after that happens at
+    exact timestamps: a packet transmits at min(user_capacity, link_capacity /
+    active users), with the rate fixed when the packet starts; a single server
+    takes dt / processing_capacity per packet instead of serving a batch per
+    step; a served packet is delivered processing_delay later.
+
+    Use it for exact per-packet timing (delays, event traces), not for speed
+    or to reproduce PacketSwitchCore's numbers. Every packet is a few Python
+    heap events, so cost grows with N / dt like the fixed-step core, and the
+    vectorized core is faster at large N (N=10^4, 10 s simulated: 3.3 s here,
+    0.1 s in the core). The metrics differ by construction: buffer_occupancy
+    is a time average under the continuous server, while the core samples the
+    buffer after each batch (12% vs 3.5% at N=100), and loss near overload
+    is somewhat higher (5.6% vs 4.7% at N=120).
+    """
+
+    def __init__(self, N_users, user_active_prob=0.1, seed=None, dt=0.05, packet_prob=0.7,
+                 max_buffer_size=50, processing_capacity=8, processing_delay=0.5, record_events=False,
+                 link=DEFAULT_LINK):
+        if link.user_classes:
+            raise ValueError("EventDrivenPacketSwitch simulates identical users; use PacketSwitchCore "
+                             "for links with user_classes")
+        self.N_users = N_users
+        self.user_active_prob = user_active_prob
+        self.link = link
+        self.link_capacity = link.link_capacity_bps
+        self.user_capacity = link.user_rate_bps
+        self.dt = dt
+        self.packet_prob = packet_prob
+        self.max_buffer_size = max_buffer_size
+        self.service_time = dt / processing_capacity
+        self.processing_delay = processing_delay
+        self.rng = np.random.default_rng(seed)
+        self.pool_probs = {'on': user_active_prob, 'off': 1 - user_active_prob, 'packet': packet_prob}
+        self.pools = {'on': [], 'off': [], 'packet': [], 'size': []}
+
+        self.time = 0.0
+        self.queue = []
+        self.seq = 0
+        self.active = [False] * N_users
+        self.run_end = [0] * N_users
+        self.active_count = 0
+        self.buffer = deque()
+        self.server_busy = False
+
+        self.generated_packets = 0
+        self.processed_packets = 0
+        self.dropped_packets = 0
+        self.bytes_delivered = 0
+        self.end_to_end_delay = DelaySketch()
+        self.queueing_delay = DelaySketch()
+        self.event_counts = np.zeros(len(EVENT_NAMES), dtype=np.int64)
+        self.buffer_area = 0.0
+        self.active_area = 0.0
+        self.record_events = record_events
+        self.event_log = []
+
+        for user in range(N_users):
+            self.schedule_activity(user, 1)
+
+    def push(self, t, kind, data):
+        # Same-time events are ordered by kind, so activity changes precede packet arrivals
+        heapq.heappush(self.queue, (t, kind, self.seq, data))
+        self.seq += 1
+
+    def draw(self, key):
+        """Next pre-drawn variate from the pool `key` ('on', 'off', 'packet' or 'size')."""
+        pool = self.pools[key]
+        if not pool:
+            if key == 'size':
+                pool.extend(self.rng.integers(500, 1501, size=4096).tolist())
+            else:
+                pool.extend(self.rng.geometric(self.pool_probs[key], size=4096).tolist())
+            pool.reverse()
+        return pool.pop()
+
+    def run_length(self, key):
+        """Geometric number of slots until an event with the pool's per-slot probability."""
+        if self.pool_probs[key] <= 0:
+            return None
+        return self.draw(key)
+
+    def schedule_activity(self, user, slot):
+        """Schedule the on transition for a user that is idle from `slot` onwards."""
+        gap = self.run_length('on')
+        if gap is not None:
+            self.push((slot + gap - 1) * self.dt, USER_ON, user)
+
+    def schedule_packet(self, user, slot):
+        """Schedule the next packet slot of an active user at or after `slot`."""
+        gap = self.run_length('packet')
+        if gap is not None and slot + gap - 1 < self.run_end[user]:
+            self.push((slot + gap - 1) * self.dt, PACKET_ARRIVAL, user)
+
+    def start_service(self):
+        if self.buffer and not self.server_busy:
+            self.server_busy = True
+            self.push(self.time + self.service_time, DEQUEUE, None)
+
+    def handle(self, kind, data):
+        if kind == USER_ON:
+            slot = int(round(self.time / self.dt))
+            length = self.run_length('off')
+            self.active[data] = True
+            self.active_count += 1
+            self.run_end[data] = slot + length if length is not None else float('inf')
+            if length is not None:
+                self.push(self.run_end[data] * self.dt, USER_OFF, data)
+            self.schedule_packet(data, slot)
+        elif kind == USER_OFF:
+            self.active[data] = False
+            self.active_count -= 1
+            # run_end is the first idle slot, so the next active slot is at least one later
+            self.schedule_activity(data, self.run_end[data] + 1)
+        elif kind == PACKET_ARRIVAL:
+            slot = int(round(self.time / self.dt))
+            size = self.draw('size')
+            rate = min(self.user_capacity, self.link_capacity / max(self.active_count, 1))
+            self.generated_packets += 1
+            self.push(self.time + size * 8 / rate, TX_COMPLETE, (size, self.time))
+            self.schedule_packet(data, slot + 1)
+        elif kind == TX_COMPLETE:
+            if len(self.buffer) < self.max_buffer_size:
+                self.buffer.append((data[0], data[1], self.time))
+                self.start_service()
+            else:
+                self.dropped_packets += 1
+        elif kind == DEQUEUE:
+            size, created, enqueued = self.buffer.popleft()
+            self.queueing_delay.add_one(self.time - enqueued)
+            self.server_busy = False
+            self.push(self.time + self.processing_delay, DELIVERY, (size, created))
+            self.start_service()
+        elif kind == DELIVERY:
+            self.processed_packets += 1
+            self.bytes_delivered += data[0]
+            self.end_to_end_delay.add_one(self.time - data[1])
+
+    def run(self, until):
+        """Process all events up to simulated time `until` and return summary metrics."""
+        while self.queue and self.queue[0][0] <= until:
+            t, kind, _, data = heapq.heappop(self.queue)
+            self.buffer_area += len(self.buffer) * (t - self.time)
+            self.active_area += self.active_count * (t - self.time)
+            self.time = t
+            self.event_counts[kind] += 1
+            if self.record_events:
+                self.event_log.append((t, kind))
+            self.handle(kind, data)
+        self.buffer_area += len(self.buffer) * (until - self.time)
+        self.active_area += self.active_count * (until - self.time)
+        self.time = until
+        return self.summary()
+
+    def summary(self):
+        elapsed = max(self.time, 1e-12)
+        throughput_mbps = self.bytes_delivered * 8 / elapsed / 1e6
+        total_packets = self.processed_packets + self.dropped_packets
+        return {
+            'time': self.time,
+            'events': int(self.event_counts.sum()),
+            'mean_active_users': self.active_area / elapsed,
+            'generated_packets': self.generated_packets,
+            'processed_packets': self.processed_packets,
+            'dropped_packets': self.dropped_packets,
+            'throughput': throughput_mbps,
+            'utilization': min(100, throughput_mbps / (self.link_capacity / 1e6) * 100),
+            'loss_rate': (self.dropped_packets / total_packets * 100) if total_packets > 0 else 0,
+            'buffer_occupancy': self.buffer_area / elapsed / self.max_buffer_size * 100,
+            'delay_p50': self.end_to_end_delay.quantile(0.5),
+            'delay_p99': self.end_to_end_delay.quantile(0.99),
+            'delay_p99.9': self.end_to_end_delay.quantile(0.999),
+            'queueing_delay_p99': self.queueing_delay.quantile(0.99),
+        }
+
+    def events(self):
+        """Recorded (timestamps, event codes) as arrays; requires record_events=True."""
+        if not self.event_log:
+            return np.empty(0), np.empty(0, dtype=np.int8)
+        times, kinds = zip(*self.event_log)
+        return np.array(times), np.array(kinds, dtype=np.int8)
@@ -0,0 +1,192 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+import numpy as np
+from collections import Counter, deque
+
+# ---------- Phase timer ----------
+class _Phase:
+    """Reusable context manager timing one named phase into its Profiler."""
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+# ---------- Profiler ----------
+class Profiler:
+    """Per-phase timers, value histograms and an optional cProfile/tracemalloc window for a stepped simulation.
+
+    A simulation calls begin_step() once per step, wraps each phase in
+    `with profiler.phase(name):` and reports per-step values with observe().
+    Aggregates (count/total/min/max per phase, histograms) cover the whole
+    run; the last max_events individual timings and samples are kept for
+    quantiles and trace export. capture=(start_step, stop_step) runs cProfile
+    (and tracemalloc when trace_memory=True) for that window only; a window
+    still open at the end is closed by stop_capture() or by leaving a
+    `with profiler:` block. Reports never stop the capture themselves.
+    """
+
+    def __init__(self, max_events=100_000, capture=None, trace_memory=False, top=25):
+        self.steps = 0
+        self.origin = time.perf_counter_ns()
+        self.events = deque(maxlen=max_events)   # (phase, step, start_ns, duration_ns)
+        self.samples = deque(maxlen=max_events)  # (name, step, time_ns, value)
+        self.totals = {}                         # phase -> [count, total_ns, min_ns, max_ns]
+        self.histograms = {}                     # name -> Counter(value -> steps)
+        self.capture = capture
+        self.trace_memory = trace_memory
+        self.top = top
+        self.cprofile_stats = None
+        self.memory_stats = None
+        self._phases = {}
+        self._profile = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_capture()
+        return False
+
+    def phase(self, name):
+        timer = self._phases.get(name)
+        if timer is None:
+            timer = self._phases[name] = _Phase(self, name)
+        return timer
+
+    def record(self, name, start_ns, duration_ns):
+        self.events.append((name, self.steps, start_ns, duration_ns))
+        total = self.totals.get(name)
+        if total is None:
+            self.totals[name] = [1, duration_ns, duration_ns, duration_ns]
+        else:
+            total[0] += 1
+            total[1] += duration_ns
+            if duration_ns < total[2]:
+                total[2] = duration_ns
+            if duration_ns > total[3]:
+                total[3] = duration_ns
+
+    def observe(self, name, value):
+        self.samples.append((name, self.steps, time.perf_counter_ns(), value))
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Counter()
+        hist[value] += 1
+
+    def begin_step(self):
+        """Advance the step counter and open/close the capture window."""
+        self.steps += 1
+        if self.capture is None:
+            return
+        start, stop = self.capture
+        if self.steps == start and self._profile is None:
+            self.start_capture()
+        elif self.steps == stop:
+            self.stop_capture()
+
+    # ---------- Capture window ----------
+    def start_capture(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop_capture(self):
+        if self._profile is None:
+            return
+        self._profile.disable()
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        rows = []
+        for (fname, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({'function': f"{fname}:{line}({func})", 'ncalls': nc, 'primitive_calls': cc,
+                         'tottime_s': tt, 'cumtime_s': ct})
+        rows.sort(key=lambda r: r['cumtime_s'], reverse=True)
+        self.cprofile_stats = rows[:self.top]
+        self._profile = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:self.top]
+            self.memory_stats = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top': [{'site': str(s.traceback), 'size_bytes': s.size, 'count': s.count} for s in top],
+            }
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+    # ---------- Reports ----------
+    def summary(self):
+        """Per-phase timing statistics (microseconds), histograms and capture results as a JSON-ready dict.
+
+        Read-only: cProfile and tracemalloc results appear once the capture window has closed.
+        """
+        durations = {}
+        for name, _, _, duration in self.events:
+            durations.setdefault(name, []).append(duration)
+        phases = {}
+        for name, (count, total, low, high) in self.totals.items():
+            recent = np.asarray(durations.get(name, [0]), dtype=float) / 1e3
+            phases[name] = {
+                'count': count,
+                'total_ms': total / 1e6,
+                'mean_us': total / count / 1e3,
+                'min_us': low / 1e3,
+                'max_us': high / 1e3,
+                'p50_us': float(np.percentile(recent, 50)),
+                'p99_us': float(np.percentile(recent, 99)),
+            }
+        return {
+            'steps': self.steps,
+            'phases': phases,
+            'histograms': {name: {str(k): v for k, v in sorted(hist.items())} for name, hist in self.histograms.items()},
+            'cprofile': self.cprofile_stats,
+            'tracemalloc': self.memory_stats,
+        }
+
+    def report(self):
+        """Readable per-phase table."""
+        phases = self.summary()['phases']
+        lines = [f"{'phase':16s} {'count':>8s} {'total ms':>10s} {'mean us':>9s} {'p99 us':>9s} {'max us':>9s}"]
+        for name, s in sorted(phases.items(), key=lambda item: -item[1]['total_ms']):
+            lines.append(f"{name:16s} {s['count']:8d} {s['total_ms']:10.2f} {s['mean_us']:9.1f} "
+                         f"{s['p99_us']:9.1f} {s['max_us']:9.1f}")
+        return "\n".join(lines)
+
+    def to_json(self, path):
+        """Summary plus the retained per-step events and samples."""
+        data = self.summary()
+        data['events'] = [{'phase': name, 'step': step, 'start_us': (start - self.origin) / 1e3, 'duration_us': dur / 1e3}
+                          for name, step, start, dur in self.events]
+        data['samples'] = [{'name': name, 'step': step, 'time_us': (t - self.origin) / 1e3, 'value': value}
+                           for name, step, t, value in self.samples]
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1, default=float)
+        return path
+
+    def to_chrome_trace(self, path, pid=0, tid=0):
+        """Chrome trace-event file (chrome://tracing, Perfetto): phases as slices, observed values as counters."""
+        trace = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid, 'ts': (start - self.origin) / 1e3,
+                  'dur': dur / 1e3, 'args': {'step': step}}
+                 for name, step, start, dur in self.events]
+        trace += [{'name': name, 'ph': 'C', 'pid': pid, 'ts': (t - self.origin) / 1e3, 'args': {name: value}}
+                  for name, step, t, value in self.samples]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f, default=float)
+        return path
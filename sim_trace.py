@@ -0,0 +1,188 @@
+import os
+import json
+import dataclasses
+import numpy as np
+
+from link_config import LinkConfig, UserClass
+from packet_switch import PacketSwitchCore
+
+TRACE_VERSION = 1
+TRACE_COLUMNS = {
+    'time': np.float64,
+    'active_users': np.int32,
+    'arrivals': np.int32,        # packets created this step
+    'completions': np.int32,     # packets delivered this step
+    'drops': np.int32,           # packets dropped at the full buffer this step
+    'buffer_depth': np.int32,    # packets waiting in the buffer after the step
+    'bytes_delivered': np.int64,
+}
+
+# ---------- Recording ----------
+class TraceRecorder:
+    """Per-step columns appended by PacketSwitchCore.step(); columns double in size when full.
+
+    With record_users=True the per-user activity of every step is also kept,
+    bit-packed (N/8 bytes per step).
+    """
+
+    def __init__(self, sim, capacity=1024, record_users=False):
+        self.steps = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in TRACE_COLUMNS.items()}
+        self.user_bits = np.zeros((capacity, (sim.N_users + 7) // 8), dtype=np.uint8) if record_users else None
+        self.meta = trace_meta(sim)
+        self.last_ids = sim.packets.next_id
+        self.last_processed = sim.processed_packets
+        self.last_dropped = sim.dropped_packets
+        self.last_bytes = sim.bytes_processed
+
+    def grow(self):
+        capacity = 2 * len(self.columns['time'])
+        for name, column in self.columns.items():
+            self.columns[name] = np.resize(column, capacity)
+        if self.user_bits is not None:
+            self.user_bits = np.resize(self.user_bits, (capacity, self.user_bits.shape[1]))
+
+    def record(self, sim, active_count):
+        if self.steps == len(self.columns['time']):
+            self.grow()
+        i = self.steps
+        c = self.columns
+        c['time'][i] = sim.time
+        c['active_users'][i] = active_count
+        c['arrivals'][i] = sim.packets.next_id - self.last_ids
+        c['completions'][i] = sim.processed_packets - self.last_processed
+        c['drops'][i] = sim.dropped_packets - self.last_dropped
+        c['buffer_depth'][i] = len(sim.buffer)
+        c['bytes_delivered'][i] = sim.bytes_processed - self.last_bytes
+        if self.user_bits is not None:
+            self.user_bits[i] = np.packbits(sim.user_active)
+        self.last_ids = sim.packets.next_id
+        self.last_processed = sim.processed_packets
+        self.last_dropped = sim.dropped_packets
+        self.last_bytes = sim.bytes_processed
+        self.steps += 1
+
+    def trace(self):
+        """The recording so far as a SimulationTrace (columns trimmed to the recorded steps)."""
+        columns = {name: column[:self.steps].copy() for name, column in self.columns.items()}
+        if self.user_bits is not None:
+            columns['user_bits'] = self.user_bits[:self.steps].copy()
+        return SimulationTrace(dict(self.meta, steps=self.steps), columns)
+
+def trace_meta(sim):
+    """Everything needed to rebuild the simulation: parameters, link and seed."""
+    seed = sim.seed
+    return {
+        'version': TRACE_VERSION,
+        'N_users': int(sim.N_users),
+        'user_active_prob': float(sim.user_active_prob),
+        'seed': [int(s) for s in seed] if np.ndim(seed) else int(seed),
+        'max_buffer_size': int(sim.max_buffer_size),
+        'processing_capacity': int(sim.processing_capacity),
+        'dt': float(sim.dt),
+        'mean_on_time': sim.mean_on_time,
+        'link': dataclasses.asdict(sim.link),
+    }
+
+# ---------- Trace files ----------
+class SimulationTrace:
+    """A recorded run: metadata (parameters and seed) plus per-step columns.
+
+    Saved as a single .npz file, or as a directory of .npy columns and a
+    meta.json that load() can memory-map.
+    """
+
+    def __init__(self, meta, columns):
+        self.meta = meta
+        self.columns = columns
+
+    def __len__(self):
+        return int(self.meta['steps'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def user_active(self, step):
+        """Activity of every user at a step (needs record_users=True)."""
+        return np.unpackbits(self.columns['user_bits'][step], count=self.meta['N_users']).astype(bool)
+
+    def save(self, path, compressed=True):
+        if path.endswith(".npz"):
+            save = np.savez_compressed if compressed else np.savez
+            save(path, meta=np.array(json.dumps(self.meta)), **self.columns)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name, column in self.columns.items():
+                np.save(os.path.join(path, f"{name}.npy"), column)
+            with open(os.path.join(path, "meta.json"), 'w') as f:
+                json.dump(self.meta, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                columns = {name: data[name] for name in data.files if name != 'meta'}
+        else:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            columns = {fname[:-4]: np.load(os.path.join(path, fname), mmap_mode='r' if mmap else None)
+                       for fname in sorted(os.listdir(path)) if fname.endswith(".npy")}
+        if meta.get('version') != TRACE_VERSION:
+            raise ValueError(f"unsupported trace version {meta.get('version')!r}")
+        return cls(meta, columns)
+
+    def summary(self):
+        """Run-level statistics computed from the columns alone."""
+        arrivals = int(self.columns['arrivals'].sum())
+        completions = int(self.columns['completions'].sum())
+        drops = int(self.columns['drops'].sum())
+        duration = len(self) * self.meta['dt']
+        return {
+            'steps': len(self),
+            'sim_time': duration,
+            'mean_active_users': float(np.mean(self.columns['active_users'])) if len(self) else 0.0,
+            'arrivals': arrivals,
+            'processed_packets': completions,
+            'dropped_packets': drops,
+            'loss_rate': drops / (completions + drops) * 100 if completions + drops else 0.0,
+            'throughput_mbps': float(self.columns['bytes_delivered'].sum()) * 8 / duration / 1e6 if duration else 0.0,
+            'mean_buffer_depth': float(np.mean(self.columns['buffer_depth'])) if len(self) else 0.0,
+        }
+
+# ---------- Replay ----------
+def link_from_meta(meta):
+    link = dict(meta['link'])
+    link['user_classes'] = tuple(UserClass(**c) for c in link['user_classes'])
+    return LinkConfig(**link)
+
+def simulation_from_meta(meta, cls=PacketSwitchCore):
+    """Rebuild a simulation (PacketSwitchCore or a subclass) with the recorded parameters and seed."""
+    # dt goes to the constructor, which sizes the throughput window and on/off transitions from it
+    return cls(meta['N_users'], meta['user_active_prob'], seed=meta['seed'], link=link_from_meta(meta),
+               mean_on_time=meta.get('mean_on_time'), max_buffer_size=meta['max_buffer_size'],
+               processing_capacity=meta['processing_capacity'], dt=meta['dt'])
+
+def replay(trace, on_step=None, verify=True):
+    """Re-run a recorded simulation step by step from its seed.
+
+    on_step(sim, step) is called after every step (e.g. to collect frame
+    snapshots). With verify=True each step is checked against the trace and a
+    divergence raises RuntimeError naming the first step and column that differ.
+    Returns the simulation in its final state.
+    """
+    sim = simulation_from_meta(trace.meta)
+    recorder = TraceRecorder(sim, capacity=1)
+    for step in range(len(trace)):
+        active_count = sim.step()
+        recorder.steps = 0
+        recorder.record(sim, active_count)
+        if verify:
+            for name in TRACE_COLUMNS:
+                if recorder.columns[name][0] != trace.columns[name][step]:
+                    raise RuntimeError(f"replay diverged at step {step}: {name} = {recorder.columns[name][0]}, "
+                                       f"trace has {trace.columns[name][step]}")
+        if on_step is not None:
+            on_step(sim, step)
+    return sim
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import argparse
+import itertools
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from packet_switch import PacketSwitchCore
+from buffer_model import arrival_pmf, BufferChain, stationary_direct, queue_metrics
+
+OUTPUT_DIR = "outputs"
+SCENARIO_KEYS = ['N', 'p', 'buffer_size', 'processing_capacity', 'seed']
+
+# ---------- Scenarios ----------
+def sweep_grid(n_values, p_values, buffer_sizes=(50,), processing_capacities=(8,), seeds=(0,)):
+    """Cartesian product of the sweep axes as a list of scenario dicts."""
+    return [dict(zip(SCENARIO_KEYS, values))
+            for values in itertools.product(n_values, p_values, buffer_sizes, processing_capacities, seeds)]
+
+def scenario_key(scenario):
+    return tuple(scenario[key] for key in SCENARIO_KEYS)
+
+def run_scenario(scenario, steps=2000):
+    """Run one headless simulation and summarise it as a flat result row."""
+    # Every scenario gets its own independent stream derived from all of its parameters
+    entropy = [int(scenario['seed']), int(scenario['N']), int(round(scenario['p'] * 1e9)),
+               int(scenario['buffer_size']), int(scenario['processing_capacity'])]
+    sim = PacketSwitchCore(int(scenario['N']), float(scenario['p']), seed=entropy,
+                           max_buffer_size=int(scenario['buffer_size']),
+                           processing_capacity=int(scenario['processing_capacity']))
+    start = time.perf_counter()
+    metrics = sim.run(steps, history=False)
+    elapsed = time.perf_counter() - start
+
+    throughput_mbps = sim.bytes_processed * 8 / sim.time / 1e6
+    total_packets = sim.processed_packets + sim.dropped_packets
+    row = dict(scenario)
+    row.update({
+        'steps': steps,
+        'sim_time': sim.time,
+        'mean_active_users': metrics['active_users']['mean'],
+        'processed_packets': sim.processed_packets,
+        'dropped_packets': sim.dropped_packets,
+        'throughput_mbps': throughput_mbps,
+        'utilization': min(100, throughput_mbps / (sim.link_capacity / 1e6) * 100),
+        'loss_rate': (sim.dropped_packets / total_packets * 100) if total_packets > 0 else 0,
+        'mean_buffer_occupancy': metrics['buffer_occupancy']['mean'],
+        'prob_overload': float(sim.theoretical_stats['prob_overload']),
+        'delay_p50': sim.end_to_end_delay.quantile(0.5),
+        'delay_p99': sim.end_to_end_delay.quantile(0.99),
+        'delay_p99.9': sim.end_to_end_delay.quantile(0.999),
+        'queueing_delay_p99': sim.queueing_delay.quantile(0.99),
+        'wall_time': elapsed,
+    })
+    # Stationary Markov chain prediction for the same buffer, as a cross-check
+    pmf = arrival_pmf(int(scenario['N']), float(scenario['p']))
+    chain = BufferChain(pmf, int(scenario['processing_capacity']), int(scenario['buffer_size']))
+    model = queue_metrics(stationary_direct(chain.transition_matrix(int(scenario['buffer_size']))), pmf,
+                          int(scenario['buffer_size']), int(scenario['processing_capacity']), sim.dt)
+    row['model_loss_rate'] = model['loss_rate']
+    row['model_buffer_occupancy'] = model['buffer_occupancy']
+    return row
+
+# ---------- Runner ----------
+def completed_keys(out_path):
+    """Scenario keys already present in a previous (possibly interrupted) results file."""
+    if not os.path.exists(out_path):
+        return set()
+    done = pd.read_csv(out_path, usecols=SCENARIO_KEYS)
+    return set(done.itertuples(index=False, name=None))
+
+def run_sweep(scenarios, steps=2000, workers=None, out_path=None, resume=True, progress=True):
+    """Run scenarios across a process pool, appending each result row to out_path (CSV) as it finishes.
+
+    With resume=True, scenarios already in out_path are skipped, so an interrupted
+    sweep picks up where it stopped. Returns all rows for the requested scenarios.
+    """
+    if out_path and not resume and os.path.exists(out_path):
+        os.remove(out_path)
+    done = completed_keys(out_path) if out_path and resume else set()
+    pending = [s for s in scenarios if scenario_key(s) not in done]
+    if progress and done:
+        print(f"Resuming: {len(scenarios) - len(pending)} of {len(scenarios)} scenarios already done")
+
+    # Every appended row uses the file's header, so the CSV never mixes column sets
+    columns = list(pd.read_csv(out_path, nrows=0).columns) if out_path and os.path.exists(out_path) else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_scenario, s, steps): s for s in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            if out_path:
+                header = columns is None
+                if header:
+                    columns = list(row)
+                elif set(row) != set(columns):
+                    raise ValueError(f"{out_path} has columns {columns}, but new rows have {list(row)}; "
+                                     f"rerun without resuming to start a fresh file")
+                pd.DataFrame([row], columns=columns).to_csv(out_path, mode='a', index=False, header=header)
+            if progress:
+                print(f"[{i}/{len(pending)}] N={row['N']} p={row['p']} buffer={row['buffer_size']} "
+                      f"capacity={row['processing_capacity']} seed={row['seed']} "
+                      f"loss={row['loss_rate']:.2f}% ({row['wall_time']:.1f}s)", flush=True)
+
+    if not out_path:
+        return pd.DataFrame()
+    df = pd.read_csv(out_path)
+    wanted = {scenario_key(s) for s in scenarios}
+    mask = [key in wanted for key in df[SCENARIO_KEYS].itertuples(index=False, name=None)]
+    return df[mask].sort_values(SCENARIO_KEYS).reset_index(drop=True)
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep over headless packet switch simulations.")
+    parser.add_argument('--N', type=int, nargs='+', default=[10, 35, 50, 100])
+    parser.add_argument('--p', type=float, nargs='+', default=[0.1])
+    parser.add_argument('--buffer', type=int, nargs='+', default=[50])
+    parser.add_argument('--capacity', type=int, nargs='+', default=[8], help="packets processed per step")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=os.path.join(OUTPUT_DIR, "sweep_results.csv"))
+    parser.add_argument('--parquet', action='store_true', help="also write the final table as Parquet")
+    parser.add_argument('--no-resume', action='store_true', help="discard an existing results file")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    scenarios = sweep_grid(args.N, args.p, args.buffer, args.capacity, args.seeds)
+    start = time.time()
+    df = run_sweep(scenarios, steps=args.steps, workers=args.workers, out_path=args.out,
+                   resume=not args.no_resume)
+    print(f"Saved {len(df)} rows to {args.out} in {time.time()-start:.1f}s")
+    if args.parquet:
+        parquet_path = os.path.splitext(args.out)[0] + ".parquet"
+        df.to_parquet(parquet_path, index=False)
+        print(f"Saved table: {parquet_path}")
+    return df
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,13 @@
+import numpy as np
+
+from circuit_switch import compare_switching, onoff_beta
+
+def test_carried_load_matches_engset_at_large_n():
+    # Idle users (N - Y of them) each offer beta Erlangs and a share B is blocked,
+    # so the carried load is Y = N beta (1 - B) / (1 + beta (1 - B)); the grid
+    # reaches the N where the truncated binomial pmf underflows
+    df = compare_switching([10, 100, 1000, 5000, 100_000], [0.001, 0.1, 0.3, 0.9])
+    beta, admitted = onoff_beta(df['p']), 1 - df['cs_blocking']
+    carried = df['N'] * beta * admitted / (1 + beta * admitted)
+    assert not df['cs_utilization'].isna().any()
+    np.testing.assert_allclose(df['cs_utilization'] * df['cs_circuits'], carried, atol=1e-9)
@@ -0,0 +1,277 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import binom
+
+from link_config import UserClass, DEFAULT_LINK
+from network_analysis import multiclass_tail_prob
+
+# ---------- Topology ----------
+class Topology:
+    """Tree of links with users attached to access links.
+
+    Link i carries traffic from its switch up to the switch of link parent[i]
+    (parent -1: the link leaves the network, e.g. the core uplink). Every link
+    has its own capacity (Mb/s), buffer size (packets) and optional processing
+    rate (packets per step). User u sends into link user_link[u] and its
+    packets follow the parent pointers to the egress. All per-link and per-user
+    attributes are arrays so the engines below work on whole topologies at once.
+    """
+
+    def __init__(self, parent, capacity_mbps, buffer_size, user_link, user_rate_mbps=DEFAULT_LINK.user_rate_mbps,
+                 user_activity=0.1, processing_rate=None, names=None):
+        self.parent = np.asarray(parent, dtype=np.int64)
+        n = self.parent.size
+        self.capacity_mbps = np.broadcast_to(np.asarray(capacity_mbps, dtype=float), n).copy()
+        self.buffer_size = np.broadcast_to(np.asarray(buffer_size, dtype=np.int64), n).copy()
+        rate = np.inf if processing_rate is None else processing_rate
+        self.processing_rate = np.broadcast_to(np.asarray(rate, dtype=float), n).copy()
+        self.user_link = np.asarray(user_link, dtype=np.int64)
+        self.user_rate_mbps = np.broadcast_to(np.asarray(user_rate_mbps, dtype=float), self.user_link.size).copy()
+        self.user_activity = np.broadcast_to(np.asarray(user_activity, dtype=float), self.user_link.size).copy()
+        self.names = list(names) if names is not None else [f"link{i}" for i in range(n)]
+
+        if np.any((self.parent < -1) | (self.parent >= n)):
+            raise ValueError("parent must index another link or be -1")
+        if np.any((self.user_link < 0) | (self.user_link >= n)):
+            raise ValueError("user_link must index a link")
+        if np.any(self.capacity_mbps <= 0):
+            raise ValueError("capacity_mbps must be positive")
+        self.depth = self.link_depths()
+        self.routes = self.route_matrix()
+
+    @property
+    def n_links(self):
+        return self.parent.size
+
+    @property
+    def n_users(self):
+        return self.user_link.size
+
+    def link_depths(self):
+        """Hops from each link to the egress (0 for egress links); raises on cycles."""
+        depth = np.zeros(self.n_links, dtype=np.int64)
+        current = self.parent.copy()
+        for _ in range(self.n_links + 1):
+            climbing = current >= 0
+            if not climbing.any():
+                return depth
+            depth[climbing] += 1
+            current[climbing] = self.parent[current[climbing]]
+        raise ValueError("parent pointers contain a cycle")
+
+    def route_matrix(self):
+        """Sparse (links x users) 0/1 matrix: entry (l, u) is 1 when user u's packets cross link l."""
+        rows, cols = [], []
+        users = np.arange(self.n_users)
+        current = self.user_link.copy()
+        while users.size:
+            rows.append(current)
+            cols.append(users)
+            current = self.parent[current]
+            keep = current >= 0
+            users, current = users[keep], current[keep]
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        return sparse.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(self.n_links, self.n_users))
+
+    @classmethod
+    def aggregation_tree(cls, n_access=4, users_per_access=25, access_capacity_mbps=1000, core_capacity_mbps=1000,
+                         buffer_size=50, user_rate_mbps=DEFAULT_LINK.user_rate_mbps, user_activity=0.1,
+                         processing_rate=None):
+        """Two-level tree: n_access access links (users_per_access users each) feeding one core link (index 0)."""
+        parent = np.concatenate([[-1], np.zeros(n_access, dtype=np.int64)])
+        capacity = np.concatenate([[core_capacity_mbps], np.full(n_access, access_capacity_mbps, dtype=float)])
+        user_link = np.repeat(np.arange(1, n_access + 1), users_per_access)
+        names = ["core"] + [f"access{i}" for i in range(n_access)]
+        return cls(parent, capacity, buffer_size, user_link, user_rate_mbps, user_activity, processing_rate, names)
+
+    @classmethod
+    def from_links(cls, links, users):
+        """Build from dicts: links = [{'name', 'parent' (name or None), 'capacity_mbps', 'buffer_size',
+        'processing_rate'?}], users = [{'link' (name), 'count', 'rate_mbps', 'activity'}]."""
+        index = {link['name']: i for i, link in enumerate(links)}
+        parent = [index[link['parent']] if link.get('parent') is not None else -1 for link in links]
+        user_link = np.concatenate([np.full(u['count'], index[u['link']]) for u in users]) if users else []
+        rates = np.concatenate([np.full(u['count'], u.get('rate_mbps', DEFAULT_LINK.user_rate_mbps)) for u in users]) if users else []
+        activity = np.concatenate([np.full(u['count'], u.get('activity', 0.1)) for u in users]) if users else []
+        processing = [np.inf if link.get('processing_rate') is None else link['processing_rate'] for link in links]
+        return cls(parent, [link['capacity_mbps'] for link in links], [link.get('buffer_size', 50) for link in links],
+                   user_link, rates, activity, processing, [link['name'] for link in links])
+
+# ---------- Analytical engine ----------
+def user_classes_per_link(topology):
+    """Distinct (rate, activity) pairs and the (links x classes) count of users of each class on every link."""
+    keys, inverse = np.unique(np.column_stack([topology.user_rate_mbps, topology.user_activity]), axis=0,
+                              return_inverse=True)
+    onehot = sparse.csr_matrix((np.ones(topology.n_users), (np.arange(topology.n_users), inverse.ravel())),
+                               shape=(topology.n_users, len(keys)))
+    counts = np.asarray((topology.routes @ onehot).todense()).round().astype(np.int64)
+    return keys, counts
+
+def overload_probabilities(topology):
+    """P(offered demand on each link > its capacity), users independent and on/off with their activity.
+
+    Demand counts every user routed over the link at full rate, i.e. it
+    ignores losses upstream, so it bounds the load a link actually sees.
+    With a single user class this is one vectorized binom.sf over all links;
+    mixed classes use the FFT demand distribution per link.
+    """
+    keys, counts = user_classes_per_link(topology)
+    if len(keys) == 0:
+        return np.zeros(topology.n_links)
+    if len(keys) == 1:
+        rate, activity = keys[0]
+        k = np.floor(topology.capacity_mbps / rate)
+        return binom.sf(k, counts[:, 0], activity)
+    out = np.empty(topology.n_links)
+    for link in range(topology.n_links):
+        classes = [UserClass(int(c), rate, activity) for (rate, activity), c in zip(keys, counts[link]) if c]
+        out[link] = multiclass_tail_prob(classes, topology.capacity_mbps[link]) if classes else 0.0
+    return out
+
+def expected_load(topology):
+    """Mean offered demand on every link as a fraction of its capacity."""
+    mean_demand = topology.routes @ (topology.user_rate_mbps * topology.user_activity)
+    return mean_demand / topology.capacity_mbps
+
+# ---------- Simulation engine ----------
+class TopologySimulation:
+    """Slotted simulation of every link queue at once.
+
+    Traffic is counted in packets of packet_bytes: an active user emits
+    rate * dt / (8 * packet_bytes) packets per step (fractions resolved at
+    random) and a link forwards up to capacity * dt / (8 * packet_bytes)
+    packets per step, and at most its processing_rate. Within a step each
+    link serves its backlog plus the new arrivals and keeps at most
+    buffer_size packets (tail drop); packets forwarded by a link join the
+    parent link on the next step. State is a handful of per-link arrays, so a
+    step costs O(links + route length) NumPy work whatever the topology size.
+    """
+
+    def __init__(self, topology, seed=None, dt=0.05, packet_bytes=1500):
+        self.topology = topology
+        self.rng = np.random.default_rng(seed)
+        self.dt = dt
+        self.packet_bytes = packet_bytes
+        n = topology.n_links
+        self.service = topology.capacity_mbps * 1e6 * dt / (8 * packet_bytes)   # packets per step
+        self.emit = topology.user_rate_mbps * 1e6 * dt / (8 * packet_bytes)     # packets per active user per step
+        self.has_parent = topology.parent >= 0
+        self.parent_index = topology.parent[self.has_parent]
+
+        self.queue = np.zeros(n)
+        self.in_flight = np.zeros(n)   # served last step, arriving at the parent this step
+        self.steps = 0
+
+        # Per-link accumulators
+        self.arrivals = np.zeros(n)
+        self.drops = np.zeros(n)
+        self.served = np.zeros(n)
+        self.delivered = 0.0
+        self.queue_sum = np.zeros(n)
+        self.overloaded_steps = np.zeros(n)
+        self.full_steps = np.zeros(n)
+
+    def step(self):
+        topo = self.topology
+        active = self.rng.random(topo.n_users) < topo.user_activity
+
+        # Offered demand at full rate over every route (for the overload statistics)
+        demand_mbps = topo.routes @ (active * topo.user_rate_mbps)
+        self.overloaded_steps += demand_mbps > topo.capacity_mbps
+
+        # New packets from active users, plus packets forwarded by child links last step
+        emit = self.emit * active
+        packets = np.floor(emit + self.rng.random(topo.n_users))
+        arriving = np.bincount(topo.user_link, weights=packets, minlength=topo.n_links) + self.in_flight
+
+        # Lindley recursion per link: serve backlog and arrivals together, drop what overflows the buffer
+        service = np.minimum(self.service, topo.processing_rate)
+        backlog = self.queue + arriving
+        served = np.minimum(backlog, service)
+        queue = np.minimum(backlog - served, topo.buffer_size)
+        self.drops += backlog - served - queue
+        self.arrivals += arriving
+        self.queue = queue
+        self.full_steps += queue >= topo.buffer_size
+
+        self.served += served
+        self.delivered += served[~self.has_parent].sum()
+        self.in_flight = np.bincount(self.parent_index, weights=served[self.has_parent], minlength=topo.n_links)
+        self.queue_sum += self.queue
+        self.steps += 1
+        return active
+
+    def run(self, steps):
+        for _ in range(steps):
+            self.step()
+        return self.link_report()
+
+    def link_report(self):
+        """Per-link analytical and simulated statistics as a DataFrame."""
+        topo = self.topology
+        steps = max(self.steps, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            loss = np.where(self.arrivals > 0, self.drops / self.arrivals, 0.0)
+            # Little's law: mean time in queue = mean queue length / throughput
+            delay = np.where(self.served > 0, self.queue_sum / self.served * self.dt, np.nan)
+        return pd.DataFrame({
+            'link': topo.names,
+            'parent': [topo.names[p] if p >= 0 else None for p in topo.parent],
+            'depth': topo.depth,
+            'capacity_mbps': topo.capacity_mbps,
+            'buffer_size': topo.buffer_size,
+            'users': np.asarray(topo.routes.sum(axis=1)).ravel().astype(np.int64),
+            'expected_load': expected_load(topo),
+            'prob_overload': overload_probabilities(topo),
+            'sim_overload': self.overloaded_steps / steps,
+            'loss_rate': loss,
+            'mean_queue': self.queue_sum / steps,
+            'queueing_delay_s': delay,
+            'buffer_full': self.full_steps / steps,
+            'throughput_mbps': self.served / steps * self.packet_bytes * 8 / self.dt / 1e6,
+        })
+
+    def end_to_end(self):
+        """Per-user mean delay (queueing plus one step per hop) and the loss along its route."""
+        report = self.link_report()
+        delay = np.nan_to_num(report['queueing_delay_s'].to_numpy()) + self.dt
+        survive = np.log1p(-np.minimum(report['loss_rate'].to_numpy(), 1 - 1e-15))
+        routes = self.topology.routes.T
+        return pd.DataFrame({
+            'user': np.arange(self.topology.n_users),
+            'access_link': [self.topology.names[l] for l in self.topology.user_link],
+            'hops': np.asarray(routes.sum(axis=1)).ravel().astype(np.int64),
+            'delay_s': routes @ delay,
+            'loss_rate': -np.expm1(routes @ survive),
+        })
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregation tree: analytical and simulated per-link overload, loss and delay.")
+    parser.add_argument('--access', type=int, default=4, help="number of access switches")
+    parser.add_argument('--users', type=int, default=25, help="users per access switch")
+    parser.add_argument('--p', type=float, default=0.1)
+    parser.add_argument('--access-capacity', type=float, default=1000, help="Mb/s")
+    parser.add_argument('--core-capacity', type=float, default=1000, help="Mb/s")
+    parser.add_argument('--buffer', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help="CSV path for the per-link table")
+    args = parser.parse_args(argv)
+
+    topo = Topology.aggregation_tree(args.access, args.users, args.access_capacity, args.core_capacity,
+                                     args.buffer, user_activity=args.p)
+    sim = TopologySimulation(topo, seed=args.seed)
+    df = sim.run(args.steps)
+    if args.out:
+        df.to_csv(args.out, index=False)
+        print(f"Saved table: {args.out}")
+    print(df.to_string(index=False))
+    return df
+
+if __name__ == "__main__":
+    main(sys.argv[1:])